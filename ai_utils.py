@@ -2,53 +2,73 @@
 Core AI interaction utilities.
 Contains functions for making AI API calls and chat functionality.
 """
+import time
 from google import genai
+from google.genai import types
 from groq import Groq
+import cassette
+from model_catalog import get_output_limit
 
 
-def ask_gemini(client: genai.Client, question: str, model_name: str = "gemma-3-27b-it") -> str | None:
+def ask_gemini(client: genai.Client, question: str, model_name: str = "gemma-3-27b-it",
+               config: types.GenerateContentConfig | None = None) -> str | None:
     """Sends a question to Gemini and returns the response.
     
     Args:
         client: Configured Gemini client.
         question: The prompt/question to send.
         model_name: Model to use (default: gemma-3-27b-it).
+        config: Optional generation config (e.g. a cached content reference).
         
     Returns:
         The model's response text, or None on error.
     """
     print("Calling Gemini with model:", model_name)
+    request = [question, config.model_dump(mode="json", exclude_none=True) if config else None]
+    if cassette.is_replaying():
+        return cassette.replay("gemini", model_name, request)
     try:
+        start = time.perf_counter()
         response = client.models.generate_content(
             model=model_name,
-            contents=question
+            contents=question,
+            config=config
         )
+        cassette.record("gemini", model_name, request, response.text, time.perf_counter() - start)
         return response.text   
     except Exception as e:
         print(f"Error during Gemini call: {e}")
         return None
 
 
-def ask_groq(client: Groq, prompt: str, model: str = "llama-3.3-70b-versatile") -> str | None:
+def ask_groq(client: Groq, prompt: str, model: str = "llama-3.3-70b-versatile",
+             max_tokens: int | None = None) -> str | None:
     """Sends a prompt to Groq and returns the response.
     
     Args:
         client: Configured Groq client.
         prompt: The prompt to send.
         model: Model to use (default: llama-3.3-70b-versatile).
+        max_tokens: Output token limit. Defaults to 4000, lowered to the
+            model's limit from the cached model catalog when that is smaller.
         
     Returns:
         The model's response text, or None on error.
     """
     try:
         print(f"Calling Groq with model: {model}")
+        if cassette.is_replaying():
+            return cassette.replay("groq", model, prompt)
+        start = time.perf_counter()
         completion = client.chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.5,
-            max_tokens=4000,
+            max_tokens=max_tokens or min(get_output_limit(model, default=4000), 4000),
         )
-        return completion.choices[0].message.content
+        content = completion.choices[0].message.content
+        cassette.record("groq", model, prompt, content, time.perf_counter() - start)
+        return content
     except Exception as e:
         print(f"Error during Groq call: {e}")
         return None
@@ -62,10 +82,39 @@ def create_chat_gemini(client: genai.Client, model_name: str = "gemma-3-27b-it")
         model_name: Model to use for chat.
         
     Returns:
-        Chat session object.
+        Chat session object. When a cassette is recording or replaying,
+        the session is wrapped so its messages go through the cassette.
     """
     try:
+        if cassette.is_replaying():
+            return cassette.CassetteChat(None, model_name)
         chat = client.chats.create(model=model_name)
+        if cassette.is_recording():
+            return cassette.CassetteChat(chat, model_name)
+        return chat
+    except Exception as e:
+        print(f"Error during Gemini call: {e}")
+        return None
+
+
+def create_async_chat_gemini(client: genai.Client, model_name: str = "gemma-3-27b-it"):
+    """Creates an asyncio Gemini chat session.
+
+    Args:
+        client: Configured Gemini client.
+        model_name: Model to use for chat.
+
+    Returns:
+        Async chat session object, or None on error. When a cassette is
+        recording or replaying, the session is wrapped so its messages go
+        through the cassette.
+    """
+    try:
+        if cassette.is_replaying():
+            return cassette.AsyncCassetteChat(None, model_name)
+        chat = client.aio.chats.create(model=model_name)
+        if cassette.is_recording():
+            return cassette.AsyncCassetteChat(chat, model_name)
         return chat
     except Exception as e:
         print(f"Error during Gemini call: {e}")
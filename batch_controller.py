@@ -0,0 +1,242 @@
+"""
+Adaptive batch-size controller for generation pipelines.
+Splits a target item count into concurrent sub-batches, learns the best
+batch size per model and tops up until the target is reached.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+from model_catalog import get_output_limit
+
+BASE_DIR = Path(__file__).parent
+
+# A batch counts as truncated when it returns less than this share of what was asked
+TRUNCATION_THRESHOLD = 0.9
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.3
+# Backoff after rounds with failed provider calls (e.g. rate limiting)
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+@dataclass
+class ModelBatchStats:
+    """Observed batch behaviour for one model."""
+    batch_size: int
+    ceiling: float | None = None
+    yield_ratio: float = 1.0
+    items_per_second: float = 0.0
+    calls: int = 0
+    truncations: int = 0
+    failures: int = 0
+
+
+class AdaptiveBatchController:
+    """Learns per-model batch sizes from observed yield, latency and truncation.
+
+    The batch size grows while batches come back complete and throughput
+    keeps improving. A full-size batch that comes back short is treated as
+    truncated and lowers the size to just under what the model actually
+    returned, which is its real output capacity. Smaller top-up batches
+    never lower the size, and failed calls are counted separately so
+    rate limiting does not shrink it.
+    When tokens_per_item is given, a model's starting ceiling comes from
+    its output limit in the cached model catalog.
+    """
+
+    def __init__(self, initial_batch_size: int = 20, min_batch_size: int = 1,
+                 max_batch_size: int = 200, max_workers: int = 4,
+                 growth_factor: float = 1.25, state_file: str | None = "batch_stats.json",
+                 tokens_per_item: int | None = None, ceiling_growth: float = 1.05):
+        self.initial_batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.growth_factor = growth_factor
+        self.state_file = state_file
+        self.tokens_per_item = tokens_per_item
+        self.ceiling_growth = ceiling_growth
+        self.stats: dict[str, ModelBatchStats] = {}
+        self._lock = threading.Lock()
+        self._load_state()
+
+    def batch_size_for(self, model_name: str) -> int:
+        """Returns the current best batch size for a model."""
+        with self._lock:
+            return self._stats_for(model_name).batch_size
+
+    def record(self, model_name: str, requested: int, received: int | None, elapsed: float) -> None:
+        """Updates the model's statistics with one finished batch.
+
+        Args:
+            model_name: Model that served the batch.
+            requested: Number of items asked for.
+            received: Number of items parsed from the response, or None
+                when the provider call failed.
+            elapsed: Wall time of the call in seconds.
+        """
+        if requested <= 0:
+            return
+        with self._lock:
+            stats = self._stats_for(model_name)
+            if received is None:
+                stats.failures += 1
+                return
+            self._update_stats(stats, requested, received, elapsed)
+
+    def _update_stats(self, stats: ModelBatchStats, requested: int, received: int, elapsed: float) -> None:
+        ratio = min(received / requested, 1.0)
+        rate = received / elapsed if elapsed > 0 else 0.0
+        previous_rate = stats.items_per_second
+
+        stats.calls += 1
+        stats.yield_ratio = _ewma(stats.yield_ratio, ratio)
+        stats.items_per_second = rate if stats.calls == 1 else _ewma(previous_rate, rate)
+
+        full_size = requested >= stats.batch_size
+        if ratio < TRUNCATION_THRESHOLD:
+            # Only full-size batches say anything about the output limit
+            if not full_size or received == 0:
+                return
+            stats.truncations += 1
+            stats.ceiling = received if stats.ceiling is None else _ewma(stats.ceiling, received)
+            new_size = int(received * TRUNCATION_THRESHOLD)
+        elif full_size and rate >= previous_rate * 0.9:
+            # Complete batch and throughput did not drop: try a bigger one
+            new_size = int(stats.batch_size * self.growth_factor) + 1
+            if stats.ceiling is not None:
+                # Let the ceiling creep up so one bad estimate is not permanent
+                stats.ceiling = max(stats.ceiling * self.ceiling_growth, stats.ceiling + 1, requested)
+                new_size = min(new_size, int(stats.ceiling * TRUNCATION_THRESHOLD))
+        else:
+            new_size = stats.batch_size
+
+        stats.batch_size = max(self.min_batch_size, min(self.max_batch_size, new_size))
+
+    def run(self, generate_fn: Callable[[int, str], list | None], target: int, model_name: str,
+            accept: Callable[[object], bool] | None = None, max_empty_rounds: int = 3,
+            max_failed_rounds: int = 8) -> list:
+        """Generates items until the target count is reached.
+
+        Each round sends up to max_workers sub-batches concurrently, sized
+        with what has been learned so far, and only asks for what is still
+        missing. Rounds with failed calls are followed by an exponential
+        backoff, so rate limiting slows the job down instead of ending it.
+
+        Args:
+            generate_fn: Function (count, model_name) -> list of items, or
+                None when the provider call failed.
+            target: Number of items wanted.
+            model_name: Model to generate with.
+            accept: Optional filter; items it rejects do not count towards the target.
+            max_empty_rounds: Stop after this many consecutive successful
+                rounds without new items (e.g. everything was a duplicate).
+            max_failed_rounds: Stop after this many consecutive rounds in
+                which every call failed, despite the backoff.
+
+        Returns:
+            List of up to target items.
+        """
+        items = []
+        empty_rounds = 0
+        failed_rounds = 0
+        round_number = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(items) < target and empty_rounds < max_empty_rounds and failed_rounds < max_failed_rounds:
+                round_number += 1
+                sizes = self._plan_round(target - len(items), model_name)
+                print(f"Round {round_number}: requesting {sum(sizes)} items in {len(sizes)} "
+                      f"batches of up to {max(sizes)} ({len(items)}/{target} done)...")
+
+                added = 0
+                failed = 0
+                for batch in executor.map(lambda size: self._run_batch(generate_fn, size, model_name), sizes):
+                    if batch is None:
+                        failed += 1
+                        continue
+                    for item in batch:
+                        if len(items) >= target:
+                            break
+                        if accept is None or accept(item):
+                            items.append(item)
+                            added += 1
+                self._save_state()
+
+                if failed == len(sizes):
+                    failed_rounds += 1
+                elif added:
+                    failed_rounds = 0
+                    empty_rounds = 0
+                else:
+                    failed_rounds = 0
+                    empty_rounds += 1
+
+                if failed and len(items) < target and failed_rounds < max_failed_rounds:
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(failed_rounds - 1, 0))
+                    print(f"{failed} of {len(sizes)} batches failed, waiting {delay:.0f}s before the next round...")
+                    time.sleep(delay)
+
+        if len(items) < target:
+            print(f"Warning: Only {len(items)} of {target} items generated.")
+        else:
+            print(f"Successfully generated {len(items)} items.")
+        return items
+
+    def _plan_round(self, remaining: int, model_name: str) -> list[int]:
+        """Splits the remaining count into at most max_workers sub-batches."""
+        size = self.batch_size_for(model_name)
+        sizes = []
+        while remaining > 0 and len(sizes) < self.max_workers:
+            sizes.append(min(size, remaining))
+            remaining -= sizes[-1]
+        return sizes
+
+    def _run_batch(self, generate_fn: Callable[[int, str], list | None], size: int, model_name: str) -> list | None:
+        """Runs one sub-batch and records how it went. Returns None if the call failed."""
+        start = time.perf_counter()
+        try:
+            batch = generate_fn(size, model_name)
+        except Exception as e:
+            print(f"Error during batch generation: {e}")
+            batch = None
+        self.record(model_name, size, None if batch is None else len(batch), time.perf_counter() - start)
+        return batch
+
+    def _stats_for(self, model_name: str) -> ModelBatchStats:
+        if model_name not in self.stats:
+            self.stats[model_name] = self._initial_stats(model_name)
+        return self.stats[model_name]
+
+    def _initial_stats(self, model_name: str) -> ModelBatchStats:
+        """Starts a model's statistics, seeding the ceiling from the model catalog when possible."""
+        stats = ModelBatchStats(batch_size=self.initial_batch_size)
+        output_limit = get_output_limit(model_name, default=0)
+        if self.tokens_per_item and output_limit:
+            stats.ceiling = output_limit / self.tokens_per_item
+            stats.batch_size = max(self.min_batch_size, min(stats.batch_size, int(stats.ceiling * TRUNCATION_THRESHOLD)))
+        return stats
+
+    def _load_state(self) -> None:
+        if not self.state_file or not (BASE_DIR / self.state_file).exists():
+            return
+        try:
+            with open(BASE_DIR / self.state_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.stats = {model: ModelBatchStats(**values) for model, values in raw.items()}
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"Ignoring unreadable batch stats file: {e}")
+
+    def _save_state(self) -> None:
+        if not self.state_file:
+            return
+        with open(BASE_DIR / self.state_file, "w", encoding="utf-8") as f:
+            json.dump({model: asdict(stats) for model, stats in self.stats.items()}, f, indent=2)
+
+
+def _ewma(previous: float, value: float) -> float:
+    return (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * value
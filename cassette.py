@@ -0,0 +1,286 @@
+"""
+Deterministic record/replay of AI calls.
+Records each request/response pair made through ask_gemini, ask_groq,
+the model scheduler and Gemini chat sessions (sync and async) to a
+cassette file, and serves them back offline.
+
+Enable with environment variables:
+    AI_CASSETTE=record|replay      mode (unset: calls go to the providers)
+    AI_CASSETTE_FILE=cassette.jsonl
+    AI_CASSETTE_LATENCY=recorded   replay delay: 'recorded', seconds, or unset for none
+or programmatically with start_recording() / start_replay().
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+BASE_DIR = Path(__file__).parent
+
+DEFAULT_CASSETTE_FILE = "cassette.jsonl"
+PREVIEW_CHARS = 200
+
+_mode: str | None = None
+_cassette_file = DEFAULT_CASSETTE_FILE
+_latency: float | str | None = None
+_entries: dict[str, deque] = defaultdict(deque)
+_unmatched: list[dict] = []
+_replayed = 0
+_recorded = 0
+_lock = threading.Lock()
+
+
+def start_recording(file_name: str = DEFAULT_CASSETTE_FILE) -> None:
+    """Records every AI call to file_name, appending to existing entries."""
+    global _mode, _cassette_file
+    _mode = "record"
+    _cassette_file = file_name
+    _register_report()
+
+
+def start_replay(file_name: str = DEFAULT_CASSETTE_FILE, latency: float | str | None = None) -> None:
+    """Serves AI calls from file_name instead of the providers.
+
+    Args:
+        file_name: Cassette to replay.
+        latency: None for no delay, 'recorded' to sleep for each call's
+            recorded latency, or a fixed number of seconds.
+    """
+    global _mode, _cassette_file, _latency
+    _mode = "replay"
+    _cassette_file = file_name
+    _latency = latency
+    _load()
+    _register_report()
+
+
+def stop() -> None:
+    """Turns recording and replay off."""
+    global _mode
+    _mode = None
+
+
+def is_recording() -> bool:
+    return _mode == "record"
+
+
+def is_replaying() -> bool:
+    return _mode == "replay"
+
+
+def is_active() -> bool:
+    return _mode is not None
+
+
+def request_key(provider: str, model: str, request) -> str:
+    """Returns the stable key identifying a request in the cassette."""
+    payload = json.dumps([provider, model, request], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record(provider: str, model: str, request, response: str | None, latency: float) -> None:
+    """Appends a request/response pair to the cassette. Failed calls are not recorded."""
+    global _recorded
+    if not is_recording() or response is None:
+        return
+    entry = {
+        "key": request_key(provider, model, request),
+        "provider": provider,
+        "model": model,
+        "preview": _preview(request),
+        "latency": round(latency, 4),
+        "response": response,
+    }
+    with _lock:
+        with open(BASE_DIR / _cassette_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        _recorded += 1
+
+
+def replay(provider: str, model: str, request) -> str | None:
+    """Returns the recorded response for a request, or None if it was never recorded.
+
+    Identical requests recorded several times are served in recorded order.
+    """
+    global _replayed
+    key = request_key(provider, model, request)
+    with _lock:
+        recorded = _entries.get(key)
+        entry = recorded.popleft() if recorded else None
+        if entry is None:
+            _unmatched.append({"provider": provider, "model": model, "preview": _preview(request)})
+        else:
+            _replayed += 1
+
+    if entry is None:
+        print(f"Cassette miss for {provider} model {model}: {_preview(request)[:80]!r}")
+        return None
+
+    delay = entry.get("latency", 0.0) if _latency == "recorded" else _latency
+    if delay:
+        time.sleep(float(delay))
+    return entry["response"]
+
+
+def recorded_call(provider: str, model: str, request, call: Callable[[], str]) -> str:
+    """Runs call() through the cassette, letting provider errors propagate.
+
+    For callers that need errors to raise rather than return None (e.g.
+    to reroute on quota errors). Outside record/replay mode this is just
+    call().
+
+    Raises:
+        LookupError: If replaying and the request was never recorded.
+    """
+    if is_replaying():
+        text = replay(provider, model, request)
+        if text is None:
+            raise LookupError(f"No recorded response for this {provider} request.")
+        return text
+    start = time.perf_counter()
+    text = call()
+    record(provider, model, request, text, time.perf_counter() - start)
+    return text
+
+
+def unmatched_requests() -> list[dict]:
+    """Returns the requests that had no recorded response during replay."""
+    with _lock:
+        return list(_unmatched)
+
+
+def report() -> None:
+    """Prints a summary of the recorded, replayed and unmatched calls."""
+    if is_recording():
+        print(f"Cassette: recorded {_recorded} calls to {_cassette_file}")
+    elif is_replaying():
+        print(f"Cassette: replayed {_replayed} calls, {len(_unmatched)} unmatched")
+        for request in _unmatched:
+            print(f" - [{request['provider']}] {request['model']}: {request['preview'][:80]!r}")
+
+
+class CassetteChat:
+    """Chat session that records or replays its messages.
+
+    Each message is keyed by the session's earlier user messages plus the
+    new one, so a replayed conversation follows the recorded one.
+    """
+
+    def __init__(self, chat, model_name: str):
+        self._chat = chat
+        self._model_name = model_name
+        self._history: list[dict] = []
+
+    def send_message(self, message: str):
+        text = recorded_call("gemini-chat", self._model_name, self._request(message),
+                             lambda: self._chat.send_message(message).text)
+        self._remember(message, text)
+        return SimpleNamespace(text=text)
+
+    def get_history(self) -> list:
+        if self._chat is not None and not is_replaying():
+            return self._chat.get_history()
+        return list(self._history)
+
+    def _request(self, message: str) -> list[str]:
+        return [turn["text"] for turn in self._history if turn["role"] == "user"] + [message]
+
+    def _replay(self, request: list[str]) -> str:
+        text = replay("gemini-chat", self._model_name, request)
+        if text is None:
+            raise LookupError("No recorded response for this chat message.")
+        return text
+
+    def _remember(self, message: str, text: str) -> None:
+        self._history.append({"role": "user", "text": message})
+        self._history.append({"role": "model", "text": text})
+
+
+class AsyncCassetteChat(CassetteChat):
+    """Asyncio chat session that records or replays its messages.
+
+    Recorded under the same keys as CassetteChat, so a conversation
+    recorded with one can be replayed with the other. Streamed replies
+    are recorded once complete and replayed as a single chunk.
+    """
+
+    async def send_message(self, message: str):
+        request = self._request(message)
+        if is_replaying():
+            text = self._replay(request)
+        else:
+            start = time.perf_counter()
+            text = (await self._chat.send_message(message)).text
+            record("gemini-chat", self._model_name, request, text, time.perf_counter() - start)
+        self._remember(message, text)
+        return SimpleNamespace(text=text)
+
+    async def send_message_stream(self, message: str):
+        request = self._request(message)
+        if is_replaying():
+            text = self._replay(request)
+            self._remember(message, text)
+            return _single_chunk(text)
+        return self._record_stream(message, request)
+
+    async def _record_stream(self, message: str, request: list[str]):
+        start = time.perf_counter()
+        parts = []
+        async for chunk in await self._chat.send_message_stream(message):
+            parts.append(chunk.text or "")
+            yield chunk
+        text = "".join(parts)
+        record("gemini-chat", self._model_name, request, text, time.perf_counter() - start)
+        self._remember(message, text)
+
+
+async def _single_chunk(text: str):
+    yield SimpleNamespace(text=text)
+
+
+def _preview(request) -> str:
+    text = request if isinstance(request, str) else json.dumps(request, ensure_ascii=False)
+    return text[:PREVIEW_CHARS]
+
+
+def _load() -> None:
+    global _replayed
+    _entries.clear()
+    _unmatched.clear()
+    _replayed = 0
+    path = BASE_DIR / _cassette_file
+    if not path.exists():
+        print(f"Cassette {_cassette_file} not found; every call will be unmatched.")
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                _entries[entry["key"]].append(entry)
+    print(f"Loaded {sum(len(v) for v in _entries.values())} recorded calls from {_cassette_file}")
+
+
+_report_registered = False
+
+
+def _register_report() -> None:
+    global _report_registered
+    if not _report_registered:
+        atexit.register(report)
+        _report_registered = True
+
+
+_env_mode = os.getenv("AI_CASSETTE", "").strip().lower()
+if _env_mode == "record":
+    start_recording(os.getenv("AI_CASSETTE_FILE", DEFAULT_CASSETTE_FILE))
+elif _env_mode == "replay":
+    _env_latency = os.getenv("AI_CASSETTE_LATENCY", "").strip().lower() or None
+    if _env_latency not in (None, "recorded"):
+        _env_latency = float(_env_latency)
+    start_replay(os.getenv("AI_CASSETTE_FILE", DEFAULT_CASSETTE_FILE), _env_latency)
@@ -2,12 +2,17 @@
 Challenge-specific utilities.
 Functions for the review processing challenge.
 """
+import os
 import re
 import json
+import time
 from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from google import genai
 from ai_utils import ask_gemini
-from file_utils import read_txt_files
+from clients import get_gemini_client
+from file_utils import read_txt_files, iter_txt_shards
+from profiling import profiled, profile_stage
 
 
 def execute_challenge(client: genai.Client) -> tuple[dict | None, str | None]:
@@ -23,8 +28,90 @@ def execute_challenge(client: genai.Client) -> tuple[dict | None, str | None]:
         Tuple of (sentiment_counts, formatted_string) or (None, None) on error.
     """
     challenge_list = read_txt_files("challenge.txt")
-    size = len(challenge_list)
-    challenge_list = "\n".join(challenge_list)
+    prompt = _build_challenge_prompt(challenge_list)
+    response = ask_gemini(client, prompt)    
+    
+    if not response:
+        print("Failed to get a response from the AI.")
+        return None, None
+
+    dict_output = _parse_challenge_response(response)
+    if dict_output is None:
+        return None, None
+
+    summary, formatted_str = format_output(dict_output)
+    return summary, formatted_str
+
+
+def execute_challenge_sharded(file_name: str = "challenge.txt", shard_size: int = 200,
+                              workers: int | None = None, requests_per_minute: int = 30,
+                              model_name: str = "gemma-3-27b-it",
+                              max_attempts: int = 3) -> tuple[dict | None, str | None]:
+    """Executes the review processing challenge on large files across processes.
+
+    The file is streamed in shards of shard_size non-empty lines. Each worker
+    process has its own Gemini client and an equal share of the requests per
+    minute. Failed shards are retried with exponential backoff inside the
+    worker. If a shard still fails, no further shards are sent. Shard
+    results are merged in file order, giving the same counts and
+    '===SEP===' string format_output would give for the whole file.
+
+    Args:
+        file_name: '$'-delimited file to process.
+        shard_size: Lines per request.
+        workers: Number of worker processes (default: CPU count).
+        requests_per_minute: Request budget shared by all workers.
+        model_name: Model to use (default: gemma-3-27b-it).
+        max_attempts: Tries per shard before it counts as failed.
+
+    Returns:
+        Tuple of (sentiment_counts, formatted_string), or (None, None) if
+        any shard still failed after its retries, since a partial result
+        would silently undercount.
+    """
+    workers = workers or os.cpu_count() or 1
+    min_interval = 60.0 * workers / requests_per_minute
+    results = {}
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                             initargs=(min_interval, model_name, max_attempts)) as executor:
+        pending = {}
+        for index, shard in enumerate(iter_txt_shards(file_name, shard_size)):
+            # Keep only a few shards in flight so huge files are never fully loaded
+            if len(pending) >= workers * 2:
+                _collect_shards(pending, results, failed)
+            if failed:
+                break
+            pending[executor.submit(_process_shard, shard)] = index
+        while pending and not failed:
+            _collect_shards(pending, results, failed)
+        if failed:
+            # The result will be discarded, so stop spending quota on it
+            for future in pending:
+                future.cancel()
+
+    if failed:
+        print(f"Error: shards {sorted(failed)} failed after {max_attempts} attempts; stopped processing {file_name}.")
+        return None, None
+    if not results:
+        print(f"Error: No lines to process in {file_name}.")
+        return None, None
+
+    counts = Counter()
+    parts = []
+    for index in sorted(results):
+        shard_counts, shard_str = results[index]
+        counts.update(shard_counts)
+        if shard_str:
+            parts.append(shard_str)
+    return dict(counts), "===SEP===".join(parts)
+
+
+def _build_challenge_prompt(lines: list[str]) -> str:
+    """Builds the challenge prompt for a list of '$'-delimited lines."""
+    size = len(lines)
+    challenge_list = "\n".join(lines)
     json_output_example = """
     [
         {
@@ -46,28 +133,98 @@ def execute_challenge(client: genai.Client) -> tuple[dict | None, str | None]:
         Example:
         {json_output_example}
     """
-    response = ask_gemini(client, prompt)    
-    
-    if not response:
-        print("Failed to get a response from the AI.")
-        return None, None
+    return prompt
+
 
+def _parse_challenge_response(response: str) -> list[dict] | None:
+    """Parses the model's JSON answer, or returns None if it is not valid JSON."""
     # Clean the response in case it contains markdown code blocks
     if response.strip().startswith("```"):
         response = re.sub(r"^```json\n|```$", "", response, flags=re.MULTILINE).strip()
     
     try:
-        dict_output = json.loads(response)
-        summary, formatted_str = format_output(dict_output)
-
-        return summary, formatted_str
+        with profile_stage("challenge_utils.parse_response"):
+            return json.loads(response)
     except json.JSONDecodeError as e:
         print(f"Failed to parse JSON: {e}")
         print("Raw response was:")
         print(response)
-        return None, None
+        return None
+
+
+_worker_client = None
+_worker_model = None
+_worker_interval = 0.0
+_worker_last_call = 0.0
+_worker_attempts = 1
+
+# Backoff between attempts of a failed shard
+SHARD_RETRY_BASE_SECONDS = 2.0
+SHARD_RETRY_MAX_SECONDS = 60.0
+
+
+def _init_shard_worker(min_interval: float, model_name: str, max_attempts: int) -> None:
+    """Creates the worker process's own client and rate-limit share."""
+    global _worker_client, _worker_model, _worker_interval, _worker_attempts
+    _worker_client = get_gemini_client()
+    _worker_model = model_name
+    _worker_interval = min_interval
+    _worker_attempts = max(1, max_attempts)
+
+
+def _process_shard(lines: list[str]) -> tuple[dict, str] | None:
+    """Runs one shard through the model in a worker process, retrying failures."""
+    prompt = _build_challenge_prompt(lines)
+    for attempt in range(_worker_attempts):
+        if attempt:
+            delay = min(SHARD_RETRY_MAX_SECONDS, SHARD_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            print(f"Retrying shard in {delay:.0f}s (attempt {attempt + 1}/{_worker_attempts})...")
+            time.sleep(delay)
+        result = _try_shard(prompt)
+        if result is not None:
+            return result
+    return None
+
+
+def _try_shard(prompt: str) -> tuple[dict, str] | None:
+    """Makes one paced attempt at a shard. Returns None if it failed."""
+    global _worker_last_call
+    wait = _worker_last_call + _worker_interval - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    _worker_last_call = time.monotonic()
+
+    response = ask_gemini(_worker_client, prompt, _worker_model)
+    if not response:
+        print("Failed to get a response from the AI.")
+        return None
+    dict_output = _parse_challenge_response(response)
+    if dict_output is None:
+        return None
+    try:
+        return format_output(dict_output)
+    except (KeyError, TypeError) as e:
+        print(f"Unexpected response structure: {e}")
+        return None
+
+
+def _collect_shards(pending: dict, results: dict, failed: list) -> None:
+    """Waits for at least one shard and stores the finished ones by index."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        index = pending.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error processing shard {index}: {e}")
+            result = None
+        if result is None:
+            failed.append(index)
+        else:
+            results[index] = result
 
 
+@profiled()
 def format_output(dict_output: list[dict]) -> tuple[dict, str]:
     """Formats the challenge output.
     
@@ -0,0 +1,245 @@
+"""
+Multi-session chat server.
+Serves the Gemini chat assistant to many concurrent users over WebSocket.
+
+Protocol (one JSON object per WebSocket message):
+    client -> server: {"session_id": "<optional id>", "message": "<text>"}
+    server -> client: {"type": "session", "session_id": ...}
+                      {"type": "chunk", "session_id": ..., "text": ...}  (streamed)
+                      {"type": "done", "session_id": ...}
+                      {"type": "error", "session_id": ..., "error": ...}
+
+A plain text message is also accepted and is sent to the connection's
+current session.
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from google import genai
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+from clients import get_gemini_client
+from ai_utils import create_async_chat_gemini
+
+
+@dataclass
+class ChatSession:
+    """A single user's chat state."""
+    chat: object
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SessionStore:
+    """In-memory chat sessions with a size cap and idle eviction.
+
+    Sessions are kept in least-recently-used order. When the store is full,
+    the oldest idle session is dropped to make room for a new one.
+    """
+
+    def __init__(self, client: genai.Client, model_name: str = "gemma-3-27b-it",
+                 max_sessions: int = 500, idle_timeout: float = 900.0):
+        self.client = client
+        self.model_name = model_name
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_or_create(self, session_id: str | None = None) -> tuple[str, ChatSession | None]:
+        """Returns an existing session or creates a new one.
+
+        Args:
+            session_id: Id of the session to resume. A new id is generated
+                when missing or unknown.
+
+        Returns:
+            Tuple of (session_id, session). Session is None when the store
+            is full of busy sessions or the chat could not be created.
+        """
+        if session_id and session_id in self._sessions:
+            session = self._sessions[session_id]
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session_id, session
+
+        session_id = session_id or uuid.uuid4().hex
+        if len(self._sessions) >= self.max_sessions and not self._evict_oldest():
+            return session_id, None
+
+        chat = create_async_chat_gemini(self.client, self.model_name)
+        if not chat:
+            return session_id, None
+
+        session = ChatSession(chat=chat)
+        self._sessions[session_id] = session
+        return session_id, session
+
+    def evict_idle(self) -> int:
+        """Drops sessions that have been idle longer than idle_timeout.
+
+        Returns:
+            Number of evicted sessions.
+        """
+        now = time.monotonic()
+        expired = [
+            sid for sid, session in self._sessions.items()
+            if now - session.last_used > self.idle_timeout and not session.lock.locked()
+        ]
+        for sid in expired:
+            del self._sessions[sid]
+        return len(expired)
+
+    def _evict_oldest(self) -> bool:
+        """Drops the least recently used session that is not mid-reply."""
+        for sid, session in self._sessions.items():
+            if not session.lock.locked():
+                del self._sessions[sid]
+                return True
+        return False
+
+
+class ChatServer:
+    """Hosts many chat sessions over WebSocket in a single process.
+
+    Provider calls are bounded by a semaphore. Requests that would have to
+    wait behind more than max_pending others are rejected right away, so
+    a slow provider never builds an unbounded backlog.
+    """
+
+    def __init__(self, client: genai.Client, model_name: str = "gemma-3-27b-it",
+                 max_concurrent: int = 8, max_pending: int = 64,
+                 max_sessions: int = 500, idle_timeout: float = 900.0,
+                 sweep_interval: float = 60.0):
+        self.store = SessionStore(client, model_name, max_sessions, idle_timeout)
+        self.max_pending = max_pending
+        self.sweep_interval = sweep_interval
+        self._provider_slots = asyncio.Semaphore(max_concurrent)
+        self._pending = 0
+
+    async def handle_connection(self, websocket: ServerConnection) -> None:
+        """Serves one WebSocket connection until it closes."""
+        current_id = None
+        try:
+            async for raw in websocket:
+                session_id, message = self._parse_message(raw, current_id)
+                if not message:
+                    await self._send(websocket, "error", session_id, error="Empty message.")
+                    continue
+
+                session_id, session = self.store.get_or_create(session_id)
+                if session is None:
+                    await self._send(websocket, "error", session_id, error="Server is full, try again later.")
+                    continue
+                if session_id != current_id:
+                    current_id = session_id
+                    await self._send(websocket, "session", session_id)
+
+                await self._reply(websocket, session_id, session, message)
+        except ConnectionClosed:
+            pass
+
+    async def _reply(self, websocket: ServerConnection, session_id: str,
+                     session: ChatSession, message: str) -> None:
+        """Streams the model's reply for a message back to the client."""
+        if self._pending >= self.max_pending:
+            await self._send(websocket, "error", session_id, error="Server is busy, try again later.")
+            return
+
+        self._pending += 1
+        try:
+            # One reply at a time per session keeps the chat history in order
+            async with session.lock, self._provider_slots:
+                session.last_used = time.monotonic()
+                try:
+                    async for chunk in await session.chat.send_message_stream(message):
+                        if chunk.text:
+                            await self._send(websocket, "chunk", session_id, text=chunk.text)
+                except ConnectionClosed:
+                    raise
+                except Exception as e:
+                    print(f"Error during Gemini call: {e}")
+                    await self._send(websocket, "error", session_id, error="Failed to get a response from the AI.")
+                    return
+                session.last_used = time.monotonic()
+        finally:
+            self._pending -= 1
+
+        await self._send(websocket, "done", session_id)
+
+    async def sweep_sessions(self) -> None:
+        """Periodically evicts idle sessions."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            evicted = self.store.evict_idle()
+            if evicted:
+                print(f"Evicted {evicted} idle sessions ({len(self.store)} active).")
+
+    @staticmethod
+    def _parse_message(raw, current_id: str | None) -> tuple[str | None, str]:
+        """Extracts (session_id, message) from a raw WebSocket message."""
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            return current_id, raw.strip()
+
+        if not isinstance(payload, dict):
+            return current_id, raw.strip()
+        session_id = payload.get("session_id")
+        # Session ids are opaque strings; anything else falls back to the current session
+        session_id = session_id.strip() if isinstance(session_id, str) else None
+        message = payload.get("message")
+        # A null or non-text message is treated as empty and rejected by the caller
+        message = message.strip() if isinstance(message, str) else ""
+        return session_id or current_id, message
+
+    @staticmethod
+    async def _send(websocket: ServerConnection, msg_type: str, session_id: str | None, **fields) -> None:
+        """Sends a JSON message. Awaiting the send applies write backpressure."""
+        await websocket.send(json.dumps({"type": msg_type, "session_id": session_id, **fields}))
+
+
+async def serve_chat(client: genai.Client, host: str = "127.0.0.1", port: int = 8765, **server_options) -> None:
+    """Runs the chat server until cancelled.
+
+    Args:
+        client: Configured Gemini client.
+        host: Interface to bind to.
+        port: Port to listen on.
+        **server_options: Extra options forwarded to ChatServer.
+    """
+    chat_server = ChatServer(client, **server_options)
+    sweeper = asyncio.create_task(chat_server.sweep_sessions())
+    try:
+        # max_queue bounds unread incoming messages per connection
+        async with serve(chat_server.handle_connection, host, port, max_queue=16) as server:
+            print(f"Chat server listening on ws://{host}:{port}")
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+
+
+def run_chat_server(host: str = "127.0.0.1", port: int = 8765, **server_options) -> None:
+    """Starts the chat server with a Gemini client from the environment.
+
+    Args:
+        host: Interface to bind to.
+        port: Port to listen on.
+        **server_options: Extra options forwarded to ChatServer.
+    """
+    client = get_gemini_client()
+    try:
+        asyncio.run(serve_chat(client, host, port, **server_options))
+    except KeyboardInterrupt:
+        print("Chat server stopped.")
+
+
+if __name__ == "__main__":
+    run_chat_server()
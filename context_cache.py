@@ -0,0 +1,143 @@
+"""
+Prompt-prefix context caching.
+Uploads the static instruction part of repeated prompts once per job as
+Gemini cached content, so each chunk only sends its own data.
+
+Caching only kicks in for models that support cached content (Gemma
+models do not) and for prefixes above Gemini's minimum cache size. The
+instruction parts of the current AI_PROMPTS are a few hundred tokens at
+most, so for them the prefix is always sent inline.
+"""
+import hashlib
+import threading
+from google import genai
+from google.genai import types
+import cassette
+from ai_utils import ask_gemini
+from model_catalog import CHARS_PER_TOKEN, supports_action
+
+# Gemini rejects cached content below a minimum token count; skip uploads
+# that are clearly too small instead of paying for a failing request
+MIN_PREFIX_TOKENS = 1024
+
+
+def split_template(template: str, data_field: str) -> tuple[str, str]:
+    """Splits a prompt template around its data placeholder.
+
+    Args:
+        template: Prompt template using str.format placeholders.
+        data_field: Name of the placeholder holding the per-chunk data.
+
+    Returns:
+        Tuple of (prefix_template, suffix_template). prefix + data + suffix
+        equals the fully formatted template.
+    """
+    placeholder = "{" + data_field + "}"
+    if placeholder not in template:
+        raise ValueError(f"Template has no '{placeholder}' placeholder.")
+    prefix, suffix = template.split(placeholder, 1)
+    return prefix, suffix
+
+
+class PrefixCache:
+    """Per-job cache of formatted prompt prefixes and their uploaded copies.
+
+    Each prefix is formatted once and, when it is shared by more than one
+    request and is large enough, uploaded once as cached content. Requests
+    then send only their data and reference the cache. Prefixes that were
+    not uploaded, or whose upload failed, are sent inline, so results are
+    the same either way. Nothing is uploaded for models without context
+    caching support. Use as a context manager to delete the uploaded
+    caches when the job ends.
+    """
+
+    def __init__(self, client: genai.Client, model_name: str = "gemma-3-27b-it",
+                 ttl_seconds: int = 600, min_prefix_tokens: int = MIN_PREFIX_TOKENS):
+        self.client = client
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.min_prefix_tokens = min_prefix_tokens
+        # Unknown models: assume only Gemma lacks cached content support
+        self.caching_supported = supports_action(
+            model_name, "createCachedContent",
+            default=not model_name.removeprefix("models/").startswith("gemma"),
+        )
+        self._formatted: dict[tuple, str] = {}
+        self._uploaded: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "PrefixCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def format_prefix(self, prefix_template: str, **fields) -> str:
+        """Formats a prefix template, reusing earlier results for the same fields."""
+        key = (prefix_template, tuple(sorted(fields.items())))
+        with self._lock:
+            if key not in self._formatted:
+                self._formatted[key] = prefix_template.format(**fields)
+            return self._formatted[key]
+
+    def ask(self, prefix: str, data: str, expected_uses: int = 2) -> str | None:
+        """Sends prefix + data, using the uploaded prefix when possible.
+
+        Args:
+            prefix: Static instruction text.
+            data: Per-request text appended after the prefix.
+            expected_uses: How many requests in the job share this prefix.
+                Prefixes used only once are never uploaded.
+
+        Returns:
+            The model's response text, or None on error.
+        """
+        cache_name = self._cache_name(prefix, expected_uses)
+        if cache_name:
+            config = types.GenerateContentConfig(cached_content=cache_name)
+            return ask_gemini(self.client, data, self.model_name, config=config)
+        return ask_gemini(self.client, prefix + data, self.model_name)
+
+    def close(self) -> None:
+        """Deletes the cached contents uploaded by this job."""
+        with self._lock:
+            names = [name for name in self._uploaded.values() if name]
+            self._uploaded.clear()
+        for name in names:
+            try:
+                self.client.caches.delete(name=name)
+            except Exception as e:
+                print(f"Error deleting cached content {name}: {e}")
+
+    def _cache_name(self, prefix: str, expected_uses: int) -> str | None:
+        """Returns the cached content name for a prefix, uploading it on first use."""
+        if not self.caching_supported or expected_uses < 2:
+            return None
+        if len(prefix) / CHARS_PER_TOKEN < self.min_prefix_tokens:
+            return None
+        # Cached content names differ per run, so cassettes always get the full prompt
+        if cassette.is_active():
+            return None
+
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        # Held during the upload so concurrent chunks never upload the same prefix twice
+        with self._lock:
+            if key not in self._uploaded:
+                self._uploaded[key] = self._upload(prefix, key)
+            return self._uploaded[key]
+
+    def _upload(self, prefix: str, key: str) -> str | None:
+        try:
+            cached = self.client.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(
+                    contents=[prefix],
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=f"prefix-{key[:16]}",
+                ),
+            )
+            print(f"Uploaded prompt prefix as cached content {cached.name}")
+            return cached.name
+        except Exception as e:
+            print(f"Context caching unavailable, sending prefix inline: {e}")
+            return None
@@ -4,6 +4,7 @@ Functions for DataFrame manipulation, filtering, and translation.
 """
 import pandas as pd
 import prompts
+from profiling import profiled
 
 
 def df_filter_by(df: pd.DataFrame, query_string: str) -> pd.DataFrame:
@@ -23,6 +24,7 @@ def df_filter_by(df: pd.DataFrame, query_string: str) -> pd.DataFrame:
         return df
 
 
+@profiled()
 def translate_to_english(df: pd.DataFrame) -> pd.DataFrame:
     """Translates a Brazilian Portuguese DataFrame to English.
     
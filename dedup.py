@@ -0,0 +1,135 @@
+"""
+Near-duplicate detection for generated texts.
+MinHash signatures with LSH banding, persisted across runs.
+"""
+import re
+import zlib
+from pathlib import Path
+from typing import Callable, Iterable
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+
+# Mersenne prime used for the universal hash family; keeps a*x+b inside uint64
+_PRIME = np.uint64((1 << 31) - 1)
+_SEED = 1234
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of texts that have already been accepted.
+
+    Each text is reduced to a MinHash signature of character shingles.
+    Signatures are split into bands, and texts sharing any band bucket are
+    compared by estimated Jaccard similarity. Lookups touch only the
+    matching buckets, so checking a new text costs about the same no
+    matter how many texts the index holds.
+    """
+
+    def __init__(self, index_file: str | None = "dedup_index.npz", num_perm: int = 128,
+                 bands: int = 16, shingle_size: int = 5, threshold: float = 0.7):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.index_file = index_file
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        rng = np.random.default_rng(_SEED)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._signatures: list[np.ndarray] = []
+        self._buckets: dict[bytes, list[int]] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Checks whether a near-duplicate of text is already indexed."""
+        return self._find_match(self.signature(text)) is not None
+
+    def add(self, text: str) -> bool:
+        """Adds text to the index unless a near-duplicate is already there.
+
+        Returns:
+            True if text was new and has been added, False if it is a duplicate.
+        """
+        signature = self.signature(text)
+        if self._find_match(signature) is not None:
+            return False
+        self._insert(signature)
+        return True
+
+    def signature(self, text: str) -> np.ndarray:
+        """Computes the MinHash signature of a text."""
+        normalized = re.sub(r"[\W_]+", " ", str(text).lower()).strip()
+        if len(normalized) <= self.shingle_size:
+            shingles = {normalized}
+        else:
+            shingles = {normalized[i:i + self.shingle_size] for i in range(len(normalized) - self.shingle_size + 1)}
+
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes %= _PRIME
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return permuted.min(axis=0)
+
+    def save(self) -> None:
+        """Writes the index to index_file."""
+        if not self.index_file:
+            return
+        signatures = np.array(self._signatures, dtype=np.uint64).reshape(-1, self.num_perm)
+        np.savez_compressed(BASE_DIR / self.index_file, signatures=signatures)
+
+    def _find_match(self, signature: np.ndarray) -> int | None:
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= self.threshold:
+                return candidate
+        return None
+
+    def _insert(self, signature: np.ndarray) -> None:
+        item_id = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(item_id)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [
+            band.to_bytes(2, "little") + signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def _load(self) -> None:
+        if not self.index_file or not (BASE_DIR / self.index_file).exists():
+            return
+        with np.load(BASE_DIR / self.index_file) as data:
+            signatures = data["signatures"]
+        if signatures.size and signatures.shape[1] != self.num_perm:
+            print(f"Ignoring dedup index built with {signatures.shape[1]} permutations.")
+            return
+        for signature in signatures:
+            self._insert(signature)
+        print(f"Loaded {len(self)} items from dedup index.")
+
+
+def dedupe_texts(items: Iterable, index: NearDuplicateIndex | None = None,
+                 key: Callable[[object], str] = str) -> list:
+    """Removes near-duplicate items, keeping the first occurrence.
+
+    Args:
+        items: Items to filter.
+        index: Index to check against and add to. A fresh in-memory index
+            is used when omitted, so only duplicates within items are removed.
+        key: Function returning the text to compare for each item.
+
+    Returns:
+        List of unique items, in their original order.
+    """
+    if index is None:
+        index = NearDuplicateIndex(index_file=None)
+    return [item for item in items if index.add(key(item))]
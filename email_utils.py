@@ -1,9 +1,29 @@
 """
 Email generation and summarization utilities.
 """
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 from google import genai
 from ai_utils import ask_gemini
+from batch_controller import AdaptiveBatchController
+from dedup import NearDuplicateIndex
+from model_catalog import CHARS_PER_TOKEN, get_context_window, get_output_limit
+from model_scheduler import ModelScheduler
+
+SUMMARY_LINE_REGEX = re.compile(r"^\s*\[?(\d+)\]?[.:)\]]?\s*(.+)$", re.MULTILINE)
+# Retries of a failed packed summary prompt, with doubling waits
+PACKED_ATTEMPTS = 3
+PACKED_RETRY_SECONDS = 2.0
+# Packing limits: used when the model is not in the model catalog
+DEFAULT_BATCH_CHARS = 12000
+# Share of the context window that packed email text may fill
+PACKED_CONTEXT_SHARE = 0.5
+# Output tokens budgeted per one-line summary
+SUMMARY_TOKENS_PER_EMAIL = 60
+# Output tokens budgeted per generated email
+EMAIL_TOKENS_PER_ITEM = 300
 
 
 def summarize_emails(client: genai.Client, email_list: list[str]) -> list[str]:
@@ -41,6 +61,173 @@ def summarize_emails(client: genai.Client, email_list: list[str]) -> list[str]:
     return summary
 
 
+def summarize_emails_batched(client: genai.Client, email_list: list[str],
+                             batch_chars: int | None = None, chunk_chars: int = 8000,
+                             max_workers: int = 4, scheduler: ModelScheduler | None = None,
+                             model_name: str = "gemma-3-27b-it") -> list[str]:
+    """Summarizes emails with as few API calls as possible.
+
+    Short emails are packed into indexed prompts and the summaries are
+    parsed back by index. Packed prompts are sized from the model's context
+    window and output limit in the cached model catalog. Emails longer than
+    chunk_chars are map-reduced: their chunks are summarized in parallel
+    and then merged into one line. Packed batches and long emails are all
+    processed concurrently.
+    Output keeps the same 'Email N Summary:' format as summarize_emails.
+
+    Args:
+        client: Configured Gemini client.
+        email_list: List of email contents to summarize.
+        batch_chars: Maximum characters of email text per packed prompt.
+            Defaults to half the model's context window, or 12000 if the
+            model is not in the catalog.
+        chunk_chars: Emails longer than this are chunked and map-reduced.
+        max_workers: Number of concurrent tasks (packed batches and long
+            emails), and separately of concurrent chunk summaries.
+        scheduler: Optional running ModelScheduler. When given, every call
+            goes through it, so requests are spread across models by quota.
+        model_name: Model to use, and to size packed prompts for.
+
+    Returns:
+        List of email summaries, in the original email order.
+    """
+    if not email_list:
+        print("No emails to summarize.")
+        return []
+
+    short_emails = []
+    long_emails = []
+    for i, mail in enumerate(email_list):
+        if not mail:
+            print("Skipping empty email...")
+        elif len(mail) > chunk_chars:
+            long_emails.append((i, mail))
+        else:
+            short_emails.append((i, mail))
+
+    if batch_chars is None:
+        context_window = get_context_window(model_name, default=0)
+        batch_chars = (int(context_window * CHARS_PER_TOKEN * PACKED_CONTEXT_SHARE)
+                       if context_window else DEFAULT_BATCH_CHARS)
+    # Every email in a batch needs its summary line to fit in one response
+    max_emails = max(1, get_output_limit(model_name, default=8192) // SUMMARY_TOKENS_PER_EMAIL)
+    batches = _pack_emails(short_emails, batch_chars, max_emails)
+    print(f"Summarizing {len(email_list)} emails in {len(batches)} packed batches "
+          f"and {len(long_emails)} map-reduced emails...")
+
+    ask = scheduler.ask if scheduler is not None else lambda prompt: ask_gemini(client, prompt, model_name)
+    results = {}
+    try:
+        # Chunk maps get their own pool: long-email tasks wait on them, so
+        # sharing one pool could fill it with waiting tasks and deadlock
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=max_workers) as chunk_executor:
+            packed_futures = [executor.submit(_summarize_packed, ask, batch) for batch in batches]
+            long_futures = [(i, executor.submit(_summarize_long_email, ask, mail, chunk_chars, chunk_executor))
+                            for i, mail in long_emails]
+            for future in packed_futures:
+                results.update(future.result())
+            for i, future in long_futures:
+                response = future.result()
+                if response:
+                    results[i] = response
+                else:
+                    print(f"Failed to get summary for email {i+1}.")
+    except Exception as e:
+        print(f"Error in summarize_emails_batched: {e}")
+
+    return [f"Email {i+1} Summary: {results[i]}" for i in sorted(results)]
+
+
+def _pack_emails(emails: list[tuple[int, str]], batch_chars: int,
+                 max_emails: int) -> list[list[tuple[int, str]]]:
+    """Groups (index, email) pairs into batches of at most batch_chars characters and max_emails emails."""
+    batches = []
+    current = []
+    size = 0
+    for i, mail in emails:
+        if current and (size + len(mail) > batch_chars or len(current) >= max_emails):
+            batches.append(current)
+            current = []
+            size = 0
+        current.append((i, mail))
+        size += len(mail)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _summarize_packed(ask: Callable[[str], str | None], batch: list[tuple[int, str]]) -> dict[int, str]:
+    """Summarizes a packed batch and maps summaries back to email indexes.
+
+    A failed packed call is retried with backoff. Only emails whose summary
+    is missing from a successful response are retried one by one; if every
+    packed attempt fails, the batch's emails are reported as failed.
+    """
+    emails_numbered = "\n\n".join(
+        f"[{n}]\n{mail.strip()}" for n, (_, mail) in enumerate(batch, 1)
+    )
+    prompt = f"""Summarize in a single line what each of the following {len(batch)} emails is about.
+    Rules:
+    1. Return ONLY a numbered list with one line per email, in the form '[number] summary'.
+    2. Do not include any preamble, introduction, or conclusion text.
+    3. Match the summaries to the email numbers exactly.
+    Emails:
+    {emails_numbered}
+    Output:"""
+
+    summaries = {}
+    if len(batch) > 1:
+        response = None
+        for attempt in range(PACKED_ATTEMPTS):
+            if attempt:
+                delay = PACKED_RETRY_SECONDS * 2 ** (attempt - 1)
+                print(f"Packed summary failed, retrying in {delay:.0f}s...")
+                time.sleep(delay)
+            response = ask(prompt)
+            if response:
+                break
+        if not response:
+            print(f"Failed to get summaries for emails {', '.join(str(i + 1) for i, _ in batch)}.")
+            return {}
+        for number, text in SUMMARY_LINE_REGEX.findall(response):
+            n = int(number)
+            if 1 <= n <= len(batch) and n not in summaries:
+                summaries[n] = text.strip()
+
+    results = {}
+    for n, (i, mail) in enumerate(batch, 1):
+        if n in summaries:
+            results[i] = summaries[n]
+            continue
+        response = ask("Summarize in a single line what this email is about:\n" + mail)
+        if response:
+            results[i] = response.strip()
+        else:
+            print(f"Failed to get summary for email {i+1}.")
+    return results
+
+
+def _summarize_long_email(ask: Callable[[str], str | None], mail: str, chunk_chars: int,
+                          executor: ThreadPoolExecutor) -> str | None:
+    """Map-reduces a long email: summarizes chunks in parallel, then merges them."""
+    chunks = [mail[start:start + chunk_chars] for start in range(0, len(mail), chunk_chars)]
+    prompts_map = [
+        f"Summarize what this part ({n} of {len(chunks)}) of an email is about in a few sentences:\n{chunk}"
+        for n, chunk in enumerate(chunks, 1)
+    ]
+    partials = [r.strip() for r in executor.map(ask, prompts_map) if r]
+    if not partials:
+        return None
+
+    merged = "\n".join(f"- {partial}" for partial in partials)
+    response = ask(
+        "These are summaries of consecutive parts of one email. "
+        "Summarize in a single line what the whole email is about:\n" + merged,
+    )
+    return response.strip() if response else None
+
+
 def execute_individual_email_generation(client: genai.Client, count: int = 20) -> list[str]:
     """Generates emails one by one.
     
@@ -68,7 +255,8 @@ def execute_individual_email_generation(client: genai.Client, count: int = 20) -
     return answer
 
 
-def execute_batch_email_generation(client: genai.Client, count: int = 20) -> list[str]:
+def execute_batch_email_generation(client: genai.Client, count: int = 20,
+                                   model_name: str = "gemma-3-27b-it") -> list[str]:
     """Generates multiple emails in a single API call.
     
     More efficient than individual generation for large counts.
@@ -76,10 +264,20 @@ def execute_batch_email_generation(client: genai.Client, count: int = 20) -> lis
     Args:
         client: Configured Gemini client.
         count: Number of emails to generate.
+        model_name: Model to use (default: gemma-3-27b-it).
         
     Returns:
         List of generated emails.
     """
+    emails = _generate_email_batch(client, count, model_name)
+    if emails is None:
+        return []
+    print(f"Successfully generated {len(emails)} emails.")
+    return emails
+
+
+def _generate_email_batch(client: genai.Client, count: int, model_name: str) -> list[str] | None:
+    """Generates one batch of emails. Returns None if the API call failed."""
     print(f"Generating {count} simulated emails in a single batch...")
     
     delimiter = "===EMAIL_SEP==="
@@ -88,14 +286,44 @@ def execute_batch_email_generation(client: genai.Client, count: int = 20) -> lis
     Avoid the content being too long or short.
     Do not include any preamble, introduction, or conclusion text - only the emails and delimiters."""
     
-    result = ask_gemini(client, prompt)
+    result = ask_gemini(client, prompt, model_name)
     
     if not result:
         print("Failed to generate batch emails.")
-        return []
+        return None
     
     # Split the result by the delimiter and clean up each email
-    emails = [email.strip() for email in result.split(delimiter) if email.strip()]
-    
-    print(f"Successfully generated {len(emails)} emails.")
+    return [email.strip() for email in result.split(delimiter) if email.strip()]
+
+
+def execute_adaptive_email_generation(client: genai.Client, count: int = 100,
+                                      model_name: str = "gemma-3-27b-it",
+                                      controller: AdaptiveBatchController | None = None,
+                                      dedup_index: NearDuplicateIndex | None = None) -> list[str]:
+    """Generates a large number of emails in concurrent, adaptively sized batches.
+
+    Keeps topping up until count emails are collected, so output-token
+    truncation of a single large batch no longer loses emails.
+
+    Args:
+        client: Configured Gemini client.
+        count: Number of emails to generate.
+        model_name: Model to use (default: gemma-3-27b-it).
+        controller: Controller to use. When omitted, a default one is created
+            with its starting batch size capped by the model's output limit.
+        dedup_index: Optional near-duplicate index. Emails similar to one
+            already indexed (in this or earlier runs) are dropped and topped up.
+
+    Returns:
+        List of generated emails.
+    """
+    controller = controller or AdaptiveBatchController(tokens_per_item=EMAIL_TOKENS_PER_ITEM)
+    emails = controller.run(
+        lambda size, model: _generate_email_batch(client, size, model),
+        count,
+        model_name,
+        accept=dedup_index.add if dedup_index is not None else None,
+    )
+    if dedup_index is not None:
+        dedup_index.save()
     return emails
@@ -2,24 +2,32 @@
 File I/O utilities.
 Handles reading and writing text and CSV files.
 """
+import codecs
 from pathlib import Path
 import pandas as pd
+from dedup import dedupe_texts
+from profiling import profiled
 
 BASE_DIR = Path(__file__).parent
 
 
-def save_txt_files(raw_data, file_name: str, separator: str = "\n") -> None:
+@profiled()
+def save_txt_files(raw_data, file_name: str, separator: str = "\n", deduplicate: bool = False) -> None:
     """Saves data to a text file.
     
     Args:
         raw_data: Data to save (can be a list or string).
         file_name: Name of the file to save to.
         separator: Separator between list items (default: newline).
+        deduplicate: Drop near-duplicate list items before saving.
     """
     if not raw_data:
         print("No data to save.")
         return
     
+    if isinstance(raw_data, list) and deduplicate:
+        raw_data = dedupe_texts(item for item in raw_data if item)
+
     if isinstance(raw_data, list):
         content = separator.join(str(item).strip() for item in raw_data if item)
     else:
@@ -29,6 +37,7 @@ def save_txt_files(raw_data, file_name: str, separator: str = "\n") -> None:
         f.write(content + "\n" if content else "")
 
 
+@profiled()
 def read_txt_files(file_name: str) -> list[str]:
     """Reads a text file and returns its lines.
     
@@ -60,6 +69,53 @@ def read_txt_files(file_name: str) -> list[str]:
     return content.split("\n")
 
 
+def iter_txt_shards(file_name: str, shard_size: int = 1000):
+    """Streams the non-empty lines of a text file in shards.
+
+    Uses the same encodings as read_txt_files, but never holds more than
+    one shard in memory.
+
+    Args:
+        file_name: Name of the file to read.
+        shard_size: Number of lines per shard.
+
+    Yields:
+        Lists of up to shard_size lines.
+
+    Raises:
+        ValueError: If file cannot be decoded with any encoding.
+    """
+    encoding = _detect_encoding(BASE_DIR / file_name)
+    shard = []
+    with open(BASE_DIR / file_name, "r", encoding=encoding) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                continue
+            shard.append(line)
+            if len(shard) >= shard_size:
+                yield shard
+                shard = []
+    if shard:
+        yield shard
+
+
+def _detect_encoding(path: Path, block_size: int = 1 << 20) -> str:
+    """Returns the first encoding that decodes the whole file, reading it in blocks."""
+    for encoding in ['utf-8', 'latin-1', 'windows-1252', 'iso-8859-1']:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, "rb") as f:
+                while block := f.read(block_size):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Failed to decode file with any of the specified encodings.")
+
+
+@profiled()
 def read_csv(file_name: str) -> pd.DataFrame:
     """Reads a CSV file into a DataFrame.
     
@@ -72,7 +128,9 @@ def read_csv(file_name: str) -> pd.DataFrame:
     return pd.read_csv(file_name)     
 
 
-def save_to_csv(file_name: str, questions: list = None, answers: list = None, data=None) -> None:
+@profiled()
+def save_to_csv(file_name: str, questions: list = None, answers: list = None, data=None,
+                deduplicate: bool = False) -> None:
     """Saves data to a CSV file.
     
     Accepts either separate 'questions' and 'answers' lists, 
@@ -83,6 +141,7 @@ def save_to_csv(file_name: str, questions: list = None, answers: list = None, da
         questions: Optional list of questions.
         answers: Optional list of answers.
         data: Optional data object (e.g., list of dicts).
+        deduplicate: Drop rows that are near-duplicates of an earlier row.
     """
     if data is not None:
         df = pd.DataFrame(data)
@@ -101,5 +160,13 @@ def save_to_csv(file_name: str, questions: list = None, answers: list = None, da
         print("Error: No data provided to save_to_csv.")
         return
 
+    if deduplicate and not df.empty:
+        # Q&A rows are compared by question, other data by the whole row
+        key_columns = ["Question"] if "Question" in df.columns else list(df.columns)
+        row_texts = df[key_columns].astype(str).agg(" ".join, axis=1)
+        unique_positions = dedupe_texts(range(len(df)), key=lambda pos: row_texts.iloc[pos])
+        print(f"Dropped {len(df) - len(unique_positions)} near-duplicate rows.")
+        df = df.iloc[unique_positions]
+
     df.to_csv(BASE_DIR / file_name, index=False, sep=',', encoding='utf-8')
     print(f"Successfully saved to {file_name}")
@@ -0,0 +1,123 @@
+"""
+Local stand-in for the Gemini REST endpoints used by the pipelines.
+Serves generateContent and cachedContents create/delete from memory, so
+context caching can be checked without network access or an API key.
+
+Run this module to start the stand-in and check PrefixCache against it:
+    python gemini_stand_in.py
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google import genai
+from google.genai import types
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers Gemini API requests and records them on the server."""
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests.append(("POST", self.path, body))
+
+        if self.path.split("?")[0].endswith("/cachedContents"):
+            name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+            self.server.caches[name] = _request_text(body)
+            self._send_json({"name": name, "model": body.get("model")})
+            return
+
+        if ":generateContent" in self.path:
+            cached = body.get("cachedContent")
+            if cached and cached not in self.server.caches:
+                self._send_json({"error": {"code": 404, "message": f"{cached} not found"}}, status=404)
+                return
+            # Echo the size of the full prompt the model would have seen
+            prompt = self.server.caches.get(cached, "") + _request_text(body)
+            reply = f"received {len(prompt)} characters"
+            self._send_json({"candidates": [{"content": {"role": "model", "parts": [{"text": reply}]}}]})
+            return
+
+        self._send_json({"error": {"code": 404, "message": "Unknown endpoint"}}, status=404)
+
+    def do_DELETE(self) -> None:
+        self.server.requests.append(("DELETE", self.path, None))
+        name = self.path.split("/v1beta/", 1)[-1].split("?")[0]
+        self.server.caches.pop(name, None)
+        self._send_json({})
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stand_in(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stand-in server in a background thread.
+
+    Args:
+        host: Interface to bind to.
+        port: Port to listen on (0 picks a free port).
+
+    Returns:
+        The running server. Its requests list holds (method, path, body)
+        for every request, and caches maps cache names to their text.
+    """
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.requests = []
+    server.caches = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_prefix_cache(model_name: str = "gemini-2.0-flash") -> bool:
+    """Runs PrefixCache against the stand-in and checks the caching flow.
+
+    A prefix shared by two requests must be uploaded once, referenced by
+    both requests instead of being sent inline, and deleted at the end.
+
+    Returns:
+        True if the check passed.
+    """
+    from context_cache import CHARS_PER_TOKEN, MIN_PREFIX_TOKENS, PrefixCache
+
+    server = start_stand_in()
+    try:
+        host, port = server.server_address
+        client = genai.Client(api_key="stand-in", http_options=types.HttpOptions(base_url=f"http://{host}:{port}"))
+        prefix = "Instructions. " * (MIN_PREFIX_TOKENS * CHARS_PER_TOKEN // 10)
+        with PrefixCache(client, model_name) as prefix_cache:
+            answers = [prefix_cache.ask(prefix, f"Data {i}.", expected_uses=2) for i in range(2)]
+
+        uploads = [body for method, path, body in server.requests if path.endswith("/cachedContents")]
+        calls = [body for method, path, body in server.requests if ":generateContent" in path]
+        deletes = [path for method, path, body in server.requests if method == "DELETE"]
+        checks = {
+            "prefix uploaded once": len(uploads) == 1,
+            "requests reference the cache": len(calls) == 2 and all(body.get("cachedContent") for body in calls),
+            "prefix not sent inline": all(len(_request_text(body)) < len(prefix) for body in calls),
+            "model saw the full prompt": answers == [f"received {len(prefix) + len(f'Data {i}.')} characters"
+                                                     for i in range(2)],
+            "cache deleted on close": len(deletes) == 1 and not server.caches,
+        }
+    finally:
+        server.shutdown()
+
+    for name, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {name}")
+    return all(checks.values())
+
+
+def _request_text(body: dict) -> str:
+    """Joins the text parts of a request's contents."""
+    return "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if check_prefix_cache() else 1)
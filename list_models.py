@@ -1,17 +1,20 @@
 """
-Utility script to list available Gemini models.
+Utility script to list available Gemini and Groq models.
+Uses the cached model catalog; pass --refresh to fetch it again.
 """
-from clients import get_gemini_client
+import sys
+from model_catalog import ensure_catalog, DEFAULT_TTL
 
 
-def list_available_models():
-    """Lists all available models from the Gemini API."""
-    client = get_gemini_client()
+def list_available_models(refresh: bool = False):
+    """Lists all available models with their token limits."""
+    catalog = ensure_catalog(ttl=0 if refresh else DEFAULT_TTL)
     
     print("Available Models:")
-    for model in client.models.list():
-        print(f" - {model.name}")
+    for info in sorted(catalog.values(), key=lambda m: (m.provider, m.name)):
+        print(f" - [{info.provider}] {info.name} "
+              f"(context: {info.context_window or '?'}, output: {info.output_limit or '?'})")
 
 
 if __name__ == "__main__":
-    list_available_models()
+    list_available_models(refresh="--refresh" in sys.argv)
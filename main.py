@@ -8,12 +8,17 @@ import pandas as pd
 # Import all modules
 from clients import get_gemini_client, get_groq_client
 from ai_utils import ask_gemini, ask_groq, chat_bot
+from chat_server import run_chat_server
+from model_scheduler import ModelScheduler
 from file_utils import read_txt_files, save_txt_files, read_csv, save_to_csv
-from email_utils import summarize_emails, execute_batch_email_generation, execute_individual_email_generation
-from review_analyzer import ai_evalution_of_feelings, ai_identify_negative_categories
+from email_utils import summarize_emails, summarize_emails_batched, execute_batch_email_generation, execute_adaptive_email_generation, execute_individual_email_generation
+from review_analyzer import ai_analyze_reviews_chunked, ai_evalution_of_feelings, ai_identify_negative_categories, ai_identify_negative_categories_clustered
+from review_analytics import ReviewAnalytics
+from sidecar_store import save_sidecar, load_with_sidecars
 from data_transform import df_filter_by, translate_to_english
-from challenge_utils import execute_challenge
-from qa_generator import generate_qa_pair_in_batch
+from challenge_utils import execute_challenge, execute_challenge_sharded
+from dedup import NearDuplicateIndex
+from qa_generator import generate_qa_pair_in_batch, generate_qa_pairs_adaptive
 
 BASE_DIR = Path(__file__).parent
 
@@ -30,6 +35,16 @@ def main():
     # model_name = "gemini-3-flash-preview"    
     # model_name = "gemini-2-flash-preview"
 
+    # Or let the scheduler pick the best model with quota left for each request:
+    # scheduler = ModelScheduler(client_gemini)
+    # futures = [scheduler.submit_prompt(q, priority=0) for q in ["What's the color of the sky?", "Why is the sea salty?"]]
+    # scheduler.run()
+    # print([f.result() for f in futures])
+    # print(scheduler.tracker.remaining())
+    # Batch pipelines can share a running scheduler:
+    # with ModelScheduler(client_gemini) as scheduler:
+    #     summaries = summarize_emails_batched(client_gemini, emails, scheduler=scheduler)
+
     # ============================================
     # Example 1: Simple Question
     # ============================================
@@ -43,6 +58,9 @@ def main():
     # history = chat_bot(client_gemini)
     # print(f"Chat history: {history}")
 
+    # Multi-user version over WebSocket (blocks until stopped):
+    # run_chat_server(port=8765)
+
     # ============================================
     # Example 3: Email Summarization
     # ============================================
@@ -51,9 +69,16 @@ def main():
     
     # New efficient batch way
     # emails = execute_batch_email_generation(client_gemini, 5)
+
+    # Large counts: concurrent sub-batches sized from observed yield, topped up to the target
+    # emails = execute_adaptive_email_generation(client_gemini, 500)
+    # Same, skipping emails near-identical to any generated in this or earlier runs
+    # emails = execute_adaptive_email_generation(client_gemini, 500, dedup_index=NearDuplicateIndex("emails_index.npz"))
     # Save emails in .txt files
     # save_txt_files(emails, "emails.txt", "\n\n--- EMAIL ---\n\n")
     # summarized_emails = summarize_emails(client_gemini, emails)
+    # Packed prompts + map-reduce for long emails (few calls for large mailboxes)
+    # summarized_emails = summarize_emails_batched(client_gemini, emails)
     # save_txt_files(summarized_emails, "summarized_emails.txt", "\n")
 
     # ============================================
@@ -73,10 +98,12 @@ def main():
     # Example 6: Q&A Generation and CSV save
     # ============================================
     # questions, answers, dict_q_a = generate_qa_pair_in_batch(client_gemini, count=5)
+    # questions, answers, dict_q_a = generate_qa_pairs_adaptive(client_gemini, count=1000)
+    # questions, answers, dict_q_a = generate_qa_pairs_adaptive(client_gemini, count=1000, dedup_index=NearDuplicateIndex("qa_index.npz"))
     # save_txt_files(questions, "questions.txt")
     # save_txt_files(answers, "answers.txt")
     # if questions and answers:
-    #     save_to_csv("results.csv", questions=questions, answers=answers)
+    #     save_to_csv("results.csv", questions=questions, answers=answers, deduplicate=True)
         # Verify the save
         # df_new = pd.read_csv(BASE_DIR / "results.csv")
         # print("\nReviewing saved CSV (from lists):")
@@ -112,22 +139,40 @@ def main():
     # df_eval = read_csv(BASE_DIR / "reviews.csv")
     # df_eval_filtered = df_eval[0:][["reviewText"]]
     # df_eval_with_feelings = ai_evalution_of_feelings(df_eval_filtered, client_gemini)
+    # Large review sets: chunked requests sharing one cached instruction prefix
+    # df_eval_with_feelings = ai_analyze_reviews_chunked(df_eval_filtered.copy(), client_gemini, "feelings", chunk_size=100)
     # df_eval["reviewFeeling"] = df_eval_with_feelings["feeling"]
     # save_to_csv("reviews_with_feelings.csv", data=df_eval)
+    # Or store only the new column, keyed by reviewerID/asin, instead of a full copy:
+    # save_sidecar(df_eval, "reviewFeeling")
+
+    # Keep nightly aggregates up to date with only the newly labeled batch
+    # analytics = ReviewAnalytics()
+    # analytics.update(df_eval, feeling_column="reviewFeeling")
+    # print(analytics.helpfulness_scores().head())
+    # print(analytics.rolling_sentiment(window_days=30).tail())
 
     # ============================================
     # Example 9: Negative Review Categories
     # ============================================
     # df_complaints = read_csv(BASE_DIR / "reviews_with_feelings.csv")
     # df_negative_reviews = df_complaints[df_complaints["reviewFeeling"] == "negative"][["reviewText"]].copy()
+    # Sidecar version: join the stored labels onto only the base columns needed
+    # df_complaints = load_with_sidecars(BASE_DIR / "reviews.csv", ["reviewFeeling"], columns=["reviewText"])
+    # df_negative_reviews = df_complaints[df_complaints["reviewFeeling"] == "negative"]
     # df_negative_reviews_with_categories = ai_identify_negative_categories(df_negative_reviews, client_groq)
+    # Cluster first, then name each cluster (one short prompt, consistent categories)
+    # df_negative_reviews_with_categories = ai_identify_negative_categories_clustered(df_negative_reviews, client_groq, n_clusters=8, extra_stopwords=["card", "product"])
     # print("\nNegative reviews with identified categories:")
     # print(df_negative_reviews_with_categories)
+    # save_sidecar(df_negative_reviews_with_categories, "category")
     
     # ============================================
     # Example 10: Challenge Execution
     # ============================================
     summary, formatted_str = execute_challenge(client_gemini)
+    # Large files: stream in shards across worker processes (same output format)
+    # summary, formatted_str = execute_challenge_sharded("challenge.txt", shard_size=200, workers=4)
 
     print("\n--- Challenge Result ---")
     print(f"Counts: {summary}")
@@ -0,0 +1,156 @@
+"""
+Model catalog with capability metadata.
+Fetches model metadata from Gemini and Groq, caches it on disk with a TTL
+and serves it locally so planning code does not need a network round-trip.
+"""
+import json
+import time
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+
+CATALOG_FILE = "model_catalog.json"
+DEFAULT_TTL = 24 * 60 * 60
+# Rough size of a token in English text, for sizing prompts before sending
+CHARS_PER_TOKEN = 4
+
+_catalog: dict[str, "ModelInfo"] | None = None
+
+
+@dataclass
+class ModelInfo:
+    """Capabilities of a single model."""
+    provider: str
+    name: str
+    context_window: int | None = None
+    output_limit: int | None = None
+    features: list[str] = field(default_factory=list)
+
+
+def refresh_catalog(gemini_client=None, groq_client=None, file_name: str = CATALOG_FILE) -> dict[str, ModelInfo]:
+    """Fetches model metadata from the providers and writes the cache file.
+
+    Args:
+        gemini_client: Configured Gemini client, or None to skip Gemini.
+        groq_client: Configured Groq client, or None to skip Groq.
+        file_name: Cache file to write.
+
+    Returns:
+        Dict mapping model name to ModelInfo.
+    """
+    global _catalog
+    catalog = {}
+
+    if gemini_client is not None:
+        try:
+            for model in gemini_client.models.list():
+                name = model.name.removeprefix("models/")
+                catalog[name] = ModelInfo(
+                    provider="gemini",
+                    name=name,
+                    context_window=model.input_token_limit,
+                    output_limit=model.output_token_limit,
+                    features=list(model.supported_actions or []),
+                )
+        except Exception as e:
+            print(f"Error listing Gemini models: {e}")
+
+    if groq_client is not None:
+        try:
+            for model in groq_client.models.list().data:
+                extra = model.model_extra or {}
+                catalog[model.id] = ModelInfo(
+                    provider="groq",
+                    name=model.id,
+                    context_window=extra.get("context_window"),
+                    output_limit=extra.get("max_completion_tokens"),
+                    features=["chat.completions"] if extra.get("active", True) else [],
+                )
+        except Exception as e:
+            print(f"Error listing Groq models: {e}")
+
+    if not catalog:
+        print("No model metadata fetched; keeping the existing catalog.")
+        return load_catalog(max_age=None, file_name=file_name)
+
+    with open(BASE_DIR / file_name, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "models": [asdict(info) for info in catalog.values()]}, f, indent=2)
+
+    _catalog = catalog
+    return catalog
+
+
+def load_catalog(max_age: float | None = DEFAULT_TTL, file_name: str = CATALOG_FILE) -> dict[str, ModelInfo]:
+    """Loads the cached catalog from disk. Never touches the network.
+
+    Args:
+        max_age: Maximum age in seconds; older caches are ignored.
+            None accepts a cache of any age.
+        file_name: Cache file to read.
+
+    Returns:
+        Dict mapping model name to ModelInfo (empty if no usable cache).
+    """
+    global _catalog
+    if _catalog is not None and max_age is None:
+        return _catalog
+
+    path = BASE_DIR / file_name
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"Ignoring unreadable model catalog: {e}")
+        return {}
+
+    if max_age is not None and time.time() - raw.get("fetched_at", 0) > max_age:
+        return {}
+
+    _catalog = {item["name"]: ModelInfo(**item) for item in raw.get("models", [])}
+    return _catalog
+
+
+def ensure_catalog(ttl: float = DEFAULT_TTL) -> dict[str, ModelInfo]:
+    """Returns the cached catalog, refreshing it from the providers when expired."""
+    catalog = load_catalog(max_age=ttl)
+    if catalog:
+        return catalog
+
+    from clients import get_gemini_client, get_groq_client
+
+    clients = {}
+    for provider, factory in (("gemini", get_gemini_client), ("groq", get_groq_client)):
+        try:
+            clients[provider] = factory()
+        except ValueError as e:
+            print(f"Skipping {provider} models: {e}")
+    return refresh_catalog(clients.get("gemini"), clients.get("groq"))
+
+
+def get_model_info(model_name: str) -> ModelInfo | None:
+    """Returns cached metadata for a model, or None if it is not known."""
+    return load_catalog(max_age=None).get(model_name.removeprefix("models/"))
+
+
+def get_output_limit(model_name: str, default: int) -> int:
+    """Returns a model's maximum output tokens, or default if unknown."""
+    info = get_model_info(model_name)
+    return info.output_limit if info and info.output_limit else default
+
+
+def supports_action(model_name: str, action: str, default: bool) -> bool:
+    """Returns whether a model supports an API action (e.g. 'createCachedContent').
+
+    Falls back to default when the model or its supported actions are unknown.
+    """
+    info = get_model_info(model_name)
+    return action in info.features if info and info.features else default
+
+
+def get_context_window(model_name: str, default: int) -> int:
+    """Returns a model's input context window in tokens, or default if unknown."""
+    info = get_model_info(model_name)
+    return info.context_window if info and info.context_window else default
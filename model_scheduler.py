@@ -0,0 +1,357 @@
+"""
+Quota-aware scheduler across the Gemini model family.
+Tracks per-minute and daily quota for each model and routes queued
+requests to the best model that still has headroom.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+from google import genai
+import cassette
+from model_catalog import CHARS_PER_TOKEN, get_context_window, supports_action
+
+BASE_DIR = Path(__file__).parent
+
+try:
+    from zoneinfo import ZoneInfo
+    # Gemini daily quotas reset at midnight Pacific time
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TIMEZONE = timezone.utc
+
+
+@dataclass
+class ModelQuota:
+    """Quota limits for one model. Lower preference is tried first."""
+    name: str
+    requests_per_minute: int
+    requests_per_day: int
+    preference: int = 0
+
+
+# Free-tier limits; adjust to match your project's quota page
+DEFAULT_MODELS = [
+    ModelQuota("gemma-3-27b-it", requests_per_minute=30, requests_per_day=14400, preference=0),
+    ModelQuota("gemini-flash-latest", requests_per_minute=10, requests_per_day=250, preference=1),
+    ModelQuota("gemini-3-flash-preview", requests_per_minute=10, requests_per_day=250, preference=2),
+    ModelQuota("gemini-2-flash-preview", requests_per_minute=10, requests_per_day=250, preference=3),
+]
+
+
+class QuotaTracker:
+    """Remaining per-minute and daily quota per model, persisted across runs."""
+
+    def __init__(self, models: list[ModelQuota], state_file: str | None = "quota_state.json"):
+        self.models = sorted(models, key=lambda m: m.preference)
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._day = _quota_day()
+        self._used_today = {m.name: 0 for m in self.models}
+        self._recent = {m.name: deque() for m in self.models}
+        self._blocked_until = {m.name: 0.0 for m in self.models}
+        self._load()
+
+    def acquire(self, allowed: frozenset[str] | None = None) -> tuple[str | None, float | None]:
+        """Reserves one request on the most preferred model with headroom.
+
+        Args:
+            allowed: Model names the request may use (None: any model).
+
+        Returns:
+            Tuple of (model_name, None) on success, (None, seconds_to_wait)
+            when every model is only minute-limited, or (None, None) when
+            every model's daily quota is used up.
+        """
+        with self._lock:
+            self._roll_day()
+            now = time.time()
+            earliest = None
+            for model in self.models:
+                name = model.name
+                if allowed is not None and name not in allowed:
+                    continue
+                if self._used_today[name] >= model.requests_per_day:
+                    continue
+                recent = self._recent[name]
+                while recent and now - recent[0] >= 60:
+                    recent.popleft()
+
+                ready_at = max(self._blocked_until[name],
+                               recent[0] + 60 if len(recent) >= model.requests_per_minute else 0.0)
+                if ready_at <= now:
+                    recent.append(now)
+                    self._used_today[name] += 1
+                    return name, None
+                earliest = ready_at if earliest is None else min(earliest, ready_at)
+
+            return None, (earliest - now if earliest is not None else None)
+
+    def report_quota_error(self, model_name: str, daily: bool) -> None:
+        """Marks a model as out of quota after the provider rejected a request."""
+        with self._lock:
+            if daily:
+                limit = next(m.requests_per_day for m in self.models if m.name == model_name)
+                self._used_today[model_name] = limit
+            else:
+                self._blocked_until[model_name] = time.time() + 60
+
+    def remaining(self) -> dict[str, dict[str, int]]:
+        """Returns the remaining minute and daily requests per model."""
+        with self._lock:
+            self._roll_day()
+            now = time.time()
+            return {
+                m.name: {
+                    "minute": max(0, m.requests_per_minute - sum(1 for t in self._recent[m.name] if now - t < 60)),
+                    "day": max(0, m.requests_per_day - self._used_today[m.name]),
+                }
+                for m in self.models
+            }
+
+    def save(self) -> None:
+        """Writes the quota state to state_file, replacing it atomically."""
+        if not self.state_file:
+            return
+        with self._lock:
+            state = {
+                "day": self._day,
+                "used_today": self._used_today,
+                "recent": {name: list(times) for name, times in self._recent.items()},
+                "blocked_until": self._blocked_until,
+            }
+        path = BASE_DIR / self.state_file
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, path)
+
+    def _roll_day(self) -> None:
+        today = _quota_day()
+        if today != self._day:
+            self._day = today
+            self._used_today = {name: 0 for name in self._used_today}
+
+    def _load(self) -> None:
+        if not self.state_file or not (BASE_DIR / self.state_file).exists():
+            return
+        try:
+            with open(BASE_DIR / self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Ignoring unreadable quota state file: {e}")
+            return
+
+        now = time.time()
+        for name in self._used_today:
+            self._recent[name].extend(t for t in state.get("recent", {}).get(name, []) if now - t < 60)
+            self._blocked_until[name] = state.get("blocked_until", {}).get(name, 0.0)
+        if state.get("day") == self._day:
+            self._used_today.update({k: v for k, v in state.get("used_today", {}).items() if k in self._used_today})
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    sequence: int
+    fn: Callable[[str], object] = field(compare=False)
+    future: Future = field(compare=False, default_factory=Future)
+    attempts: int = field(compare=False, default=0)
+    models: frozenset[str] | None = field(compare=False, default=None)
+
+
+class ModelScheduler:
+    """Priority queue of pending requests dispatched across several models.
+
+    Jobs are functions that receive the chosen model name. When a model runs
+    out of quota, its jobs move on to the next model with headroom instead
+    of failing, and the scheduler only waits when every model is limited.
+    Models the cached model catalog lists without generateContent support
+    are left out, and prompts only go to models whose context window fits.
+
+    Either queue jobs and call run(), or use the scheduler as a context
+    manager: it then dispatches in a background thread and pipelines can
+    make blocking calls with ask() from any thread.
+    """
+
+    def __init__(self, client: genai.Client, models: list[ModelQuota] | None = None,
+                 state_file: str | None = "quota_state.json", max_workers: int = 4,
+                 max_attempts: int = 3, save_interval: float = 30.0):
+        self.client = client
+        models = models or DEFAULT_MODELS
+        usable = [m for m in models if supports_action(m.name, "generateContent", default=True)]
+        for model in models:
+            if model not in usable:
+                print(f"Skipping {model.name}: the model catalog lists no generateContent support.")
+        self.tracker = QuotaTracker(usable or models, state_file)
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.save_interval = save_interval
+        self._queue: list[_Job] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._dispatcher: threading.Thread | None = None
+        self._stopping = False
+
+    def __enter__(self) -> "ModelScheduler":
+        self._stopping = False
+        self._dispatcher = threading.Thread(target=self.run, kwargs={"until_stopped": True}, daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        self._dispatcher = None
+
+    def submit(self, fn: Callable[[str], object], priority: int = 10,
+               models: list[str] | None = None) -> Future:
+        """Queues a job. Lower priority values run first.
+
+        Args:
+            fn: Function called with the model name; should raise on API errors.
+            priority: Job priority.
+            models: Model names the job may run on (None: any model).
+
+        Returns:
+            Future with the job's result (None if it could not be run).
+        """
+        job = _Job(priority, next(self._sequence), fn, models=None if models is None else frozenset(models))
+        with self._condition:
+            heapq.heappush(self._queue, job)
+            self._condition.notify()
+        return job.future
+
+    def submit_prompt(self, prompt: str, priority: int = 10) -> Future:
+        """Queues a Gemini prompt. The future resolves to the response text.
+
+        The prompt only goes to models whose context window fits it.
+        """
+        models = self.models_for(len(prompt) // CHARS_PER_TOKEN)
+        if not models:
+            print("Prompt is larger than the context window of every scheduled model.")
+            future = Future()
+            future.set_result(None)
+            return future
+        return self.submit(lambda model_name: _generate(self.client, prompt, model_name), priority, models)
+
+    def models_for(self, prompt_tokens: int) -> list[str]:
+        """Returns the scheduled models whose cached context window fits a prompt.
+
+        Models missing from the catalog are assumed to fit.
+        """
+        return [m.name for m in self.tracker.models
+                if get_context_window(m.name, default=prompt_tokens) >= prompt_tokens]
+
+    def ask(self, prompt: str, priority: int = 10) -> str | None:
+        """Sends a Gemini prompt through the running scheduler and waits for it.
+
+        Returns:
+            The response text, or None if the request could not be run.
+
+        Raises:
+            RuntimeError: If the scheduler is not running as a context manager.
+        """
+        if self._dispatcher is None:
+            raise RuntimeError("ModelScheduler.ask() needs a running scheduler; use it in a 'with' block.")
+        return self.submit_prompt(prompt, priority).result()
+
+    def run(self, until_stopped: bool = False) -> None:
+        """Runs queued jobs until the queue is empty.
+
+        Quota state is saved every save_interval seconds and when the run
+        ends, including when it ends with an error.
+
+        Args:
+            until_stopped: Keep waiting for new jobs until the context
+                manager exits instead of returning on an empty queue.
+        """
+        last_save = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while True:
+                    if time.monotonic() - last_save >= self.save_interval:
+                        self.tracker.save()
+                        last_save = time.monotonic()
+
+                    with self._condition:
+                        if not self._queue and not self._in_flight and (not until_stopped or self._stopping):
+                            break
+                        if not self._queue or self._in_flight >= self.max_workers:
+                            self._condition.wait(timeout=1.0)
+                            continue
+
+                        job = self._queue[0]
+                        model_name, wait = self.tracker.acquire(job.models)
+                        if model_name is None:
+                            if wait is None:
+                                print("Daily quota exhausted for every model this request can use; dropping it.")
+                                heapq.heappop(self._queue).future.set_result(None)
+                            else:
+                                self._condition.wait(timeout=min(wait, self.save_interval))
+                            continue
+
+                        job = heapq.heappop(self._queue)
+                        self._in_flight += 1
+                    executor.submit(self._execute, job, model_name)
+        finally:
+            self.tracker.save()
+
+    def _execute(self, job: _Job, model_name: str) -> None:
+        try:
+            job.future.set_result(job.fn(model_name))
+        except LookupError as e:
+            # Cassette miss: retrying would only repeat it
+            print(f"Error during {model_name} call: {e}")
+            job.future.set_result(None)
+        except Exception as e:
+            job.attempts += 1
+            if _is_quota_error(e) and job.attempts < self.max_attempts * len(self.tracker.models):
+                print(f"Quota reached for {model_name}, rescheduling request.")
+                # Daily quota errors name a "...PerDay..." quota metric
+                self.tracker.report_quota_error(model_name, daily="perday" in str(e).lower())
+                with self._condition:
+                    heapq.heappush(self._queue, job)
+            elif job.attempts < self.max_attempts:
+                print(f"Error during {model_name} call, retrying: {e}")
+                with self._condition:
+                    heapq.heappush(self._queue, job)
+            else:
+                print(f"Error during {model_name} call, giving up: {e}")
+                job.future.set_result(None)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+
+def _generate(client: genai.Client, prompt: str, model_name: str) -> str:
+    """Calls Gemini, letting API errors propagate so quota errors can be rerouted.
+
+    Goes through the cassette with the same request key as ask_gemini, so
+    scheduled prompts are recorded and replayed like direct ones.
+    """
+    print("Calling Gemini with model:", model_name)
+    return cassette.recorded_call(
+        "gemini", model_name, [prompt, None],
+        lambda: client.models.generate_content(model=model_name, contents=prompt).text,
+    )
+
+
+def _is_quota_error(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def _quota_day() -> str:
+    return datetime.now(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
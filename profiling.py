@@ -0,0 +1,193 @@
+"""
+Opt-in profiling hooks for local pipeline stages.
+Records wall time, CPU time and peak allocation per stage, plus cProfile
+hot spots, and writes them to a report file.
+
+Enable with the AI_PROFILE environment variable (set it to a report file
+name, or to 1 for the default 'profile_report.txt') or by calling
+enable_profiling(). When disabled, the hooks cost a single flag check.
+"""
+import atexit
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+
+DEFAULT_REPORT_FILE = "profile_report.txt"
+
+
+@dataclass
+class StageStats:
+    """Accumulated measurements for one stage."""
+    calls: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_bytes: int = 0
+    profiled_calls: int = 0
+    profile: pstats.Stats | None = None
+
+
+@dataclass
+class _Frame:
+    start_bytes: int
+    child_peak: int = 0
+
+
+_enabled = False
+_report_file = DEFAULT_REPORT_FILE
+_sample_every = 1
+_stages: dict[str, StageStats] = {}
+_stages_lock = threading.Lock()
+# Only one cProfile profiler can be active at a time
+_profiler_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable_profiling(report_file: str = DEFAULT_REPORT_FILE, sample_every: int = 1) -> None:
+    """Turns profiling on for the rest of the run.
+
+    Args:
+        report_file: File the report is written to at exit.
+        sample_every: Run cProfile on every Nth call of a stage. Timing and
+            memory are recorded for every call.
+    """
+    global _enabled, _report_file, _sample_every
+    if not _enabled:
+        atexit.register(write_report)
+    _enabled = True
+    _report_file = report_file
+    _sample_every = max(1, sample_every)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_profiling() -> None:
+    """Turns profiling off. Collected stats are kept until written."""
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Measures the enclosed block as a pipeline stage.
+
+    Nested stages are measured too; cProfile only runs for the outermost
+    stage of a thread. Peak allocation is process-wide, so stages running
+    at the same time in different threads share their peaks.
+    """
+    if not _enabled:
+        yield
+        return
+
+    stack = _frame_stack()
+    with _stages_lock:
+        stats = _stages.setdefault(name, StageStats())
+        stats.calls += 1
+        sampled = (stats.calls - 1) % _sample_every == 0
+
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1].child_peak = max(stack[-1].child_peak, peak)
+    tracemalloc.reset_peak()
+    frame = _Frame(start_bytes=current)
+    stack.append(frame)
+
+    profiler = None
+    if sampled and len(stack) == 1 and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+
+        _, peak = tracemalloc.get_traced_memory()
+        absolute_peak = max(peak, frame.child_peak)
+        stack.pop()
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, absolute_peak)
+
+        with _stages_lock:
+            stats.wall_time += wall
+            stats.cpu_time += cpu
+            stats.peak_bytes = max(stats.peak_bytes, absolute_peak - frame.start_bytes)
+            if profiler is not None:
+                stats.profiled_calls += 1
+                if stats.profile is None:
+                    stats.profile = pstats.Stats(profiler)
+                else:
+                    stats.profile.add(profiler)
+
+
+def profiled(name: str | None = None):
+    """Decorator that measures every call of a function as a stage.
+
+    Args:
+        name: Stage name (default: module.function).
+    """
+    def decorator(fn):
+        stage_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with profile_stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_report(top_functions: int = 15) -> None:
+    """Writes per-stage measurements and cProfile hot spots to the report file."""
+    with _stages_lock:
+        stages = sorted(_stages.items(), key=lambda item: item[1].wall_time, reverse=True)
+    if not stages:
+        return
+
+    out = io.StringIO()
+    out.write(f"{'Stage':<45} {'calls':>7} {'wall_s':>10} {'cpu_s':>10} {'peak_kib':>10}\n")
+    for name, stats in stages:
+        out.write(f"{name:<45} {stats.calls:>7} {stats.wall_time:>10.4f} "
+                  f"{stats.cpu_time:>10.4f} {stats.peak_bytes / 1024:>10.1f}\n")
+
+    for name, stats in stages:
+        if stats.profile is None:
+            continue
+        out.write(f"\n=== {name}: top {top_functions} functions by cumulative time "
+                  f"({stats.profiled_calls} profiled calls) ===\n")
+        stats.profile.stream = out
+        stats.profile.sort_stats("cumulative").print_stats(top_functions)
+
+    with open(BASE_DIR / _report_file, "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+    print(f"Profiling report saved to {_report_file}")
+
+
+def _frame_stack() -> list[_Frame]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+_env_setting = os.getenv("AI_PROFILE", "").strip()
+if _env_setting and _env_setting.lower() not in ("0", "false", "no"):
+    enable_profiling(DEFAULT_REPORT_FILE if _env_setting.lower() in ("1", "true", "yes") else _env_setting)
@@ -86,5 +86,25 @@ AI_PROMPTS = {
         Output:""",
         "regex": r"\d+\.\s*(.+)",
         "column": "category"
+    },
+    "cluster_labels": {
+        "prompt": """You are a professional sentiment analyzer.
+        I will provide {count} groups of similar negative customer reviews.
+        Each group contains a few example reviews separated by ' | '.
+        You have to create one short general category (2 to 4 words) for each group.
+        Rules:
+        1. Return ONLY a numbered list of categories, one per group.
+        2. Do not include the original reviews or any introductory text.
+        3. Match the categories to the group numbers exactly.
+        4. Use distinct categories for groups with different complaints.
+        Input Groups:
+        {reviews}
+        Example Output:
+        1. category
+        2. category
+        ... and so on.
+        Output:""",
+        "regex": r"\d+\.\s*(.+)",
+        "column": "category"
     }
 }
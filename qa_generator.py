@@ -4,14 +4,21 @@ Question & Answer generation utilities.
 from typing import List, Dict
 from google import genai
 from ai_utils import ask_gemini
+from batch_controller import AdaptiveBatchController
+from dedup import NearDuplicateIndex
 
+# Output tokens budgeted per generated Q&A pair
+QA_TOKENS_PER_ITEM = 200
 
-def generate_qa_pair_in_batch(client: genai.Client, count: int = 10) -> tuple[List[str], List[str], List[Dict[str, str]]]:
+
+def generate_qa_pair_in_batch(client: genai.Client, count: int = 10,
+                              model_name: str = "gemma-3-27b-it") -> tuple[List[str], List[str], List[Dict[str, str]]]:
     """Generates Q&A pairs in a single batch API call.
     
     Args:
         client: Configured Gemini client.
         count: Number of Q&A pairs to generate.
+        model_name: Model to use (default: gemma-3-27b-it).
         
     Returns:
         Tuple containing:
@@ -19,6 +26,17 @@ def generate_qa_pair_in_batch(client: genai.Client, count: int = 10) -> tuple[Li
         - List of answers  
         - List of dictionaries with Question/Answer keys
     """
+    dict_q_a = _generate_qa_batch(client, count, model_name)
+    if dict_q_a is None:
+        return [], [], []
+    questions = [pair["Question"] for pair in dict_q_a]
+    answers = [pair["Answer"] for pair in dict_q_a]
+    print(f"Successfully generated {len(questions)} Q&A pairs (lists + dict list).")
+    return questions, answers, dict_q_a
+
+
+def _generate_qa_batch(client: genai.Client, count: int, model_name: str) -> List[Dict[str, str]] | None:
+    """Generates one batch of Q&A pairs. Returns None if the API call failed."""
     print(f"Generating {count} Q&A pairs in a single batch...")
     
     q_delimiter = "===QUESTION_SEP==="
@@ -41,23 +59,52 @@ def generate_qa_pair_in_batch(client: genai.Client, count: int = 10) -> tuple[Li
     Question text {q_delimiter} Answer text {pair_delimiter} Next question {q_delimiter} Next answer ...
     """
     
-    result = ask_gemini(client, prompt)
+    result = ask_gemini(client, prompt, model_name)
     
     if not result:
         print("Failed to generate batch Q&A.")
-        return [], [], []
+        return None
     
-    questions = []
-    answers = []
     dict_q_a = []
-    
     pairs = [pair.strip() for pair in result.split(pair_delimiter) if pair.strip()]
     for pair in pairs:
         if q_delimiter in pair:
             parts = pair.split(q_delimiter)
-            questions.append(parts[0].strip())
-            answers.append(parts[1].strip())
             dict_q_a.append({"Question": parts[0].strip(), "Answer": parts[1].strip()})
-            
-    print(f"Successfully generated {len(questions)} Q&A pairs (lists + dict list).")
+    return dict_q_a
+
+
+def generate_qa_pairs_adaptive(client: genai.Client, count: int = 100,
+                               model_name: str = "gemma-3-27b-it",
+                               controller: AdaptiveBatchController | None = None,
+                               dedup_index: NearDuplicateIndex | None = None) -> tuple[List[str], List[str], List[Dict[str, str]]]:
+    """Generates a large number of Q&A pairs in concurrent, adaptively sized batches.
+
+    Keeps topping up until count pairs are collected, so output-token
+    truncation of a single large batch no longer loses pairs.
+
+    Args:
+        client: Configured Gemini client.
+        count: Number of Q&A pairs to generate.
+        model_name: Model to use (default: gemma-3-27b-it).
+        controller: Controller to use. When omitted, a default one is created
+            with its starting batch size capped by the model's output limit.
+        dedup_index: Optional near-duplicate index over questions. Pairs whose
+            question is similar to one already indexed (in this or earlier
+            runs) are dropped and topped up.
+
+    Returns:
+        Same tuple as generate_qa_pair_in_batch.
+    """
+    controller = controller or AdaptiveBatchController(tokens_per_item=QA_TOKENS_PER_ITEM)
+    dict_q_a = controller.run(
+        lambda size, model: _generate_qa_batch(client, size, model),
+        count,
+        model_name,
+        accept=(lambda pair: dedup_index.add(pair["Question"])) if dedup_index is not None else None,
+    )
+    if dedup_index is not None:
+        dedup_index.save()
+    questions = [pair["Question"] for pair in dict_q_a]
+    answers = [pair["Answer"] for pair in dict_q_a]
     return questions, answers, dict_q_a
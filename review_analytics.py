@@ -0,0 +1,163 @@
+"""
+Incremental sentiment analytics for labeled reviews.
+Keeps materialized aggregates up to date as new labeled reviews arrive.
+"""
+import sqlite3
+from contextlib import closing, contextmanager
+from pathlib import Path
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+
+FEELINGS = ["positive", "neutral", "negative"]
+FEELING_SCORES = {"positive": 1.0, "neutral": 0.0, "negative": -1.0}
+KEY_COLUMNS = ["reviewerID", "asin"]
+SECONDS_PER_DAY = 86400
+ANALYTICS_DB = "analytics.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_keys (
+    reviewerID TEXT, asin TEXT, PRIMARY KEY (reviewerID, asin)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS product_sentiment (
+    asin TEXT PRIMARY KEY, positive INTEGER, neutral INTEGER, negative INTEGER);
+CREATE TABLE IF NOT EXISTS daily_sentiment (
+    day INTEGER PRIMARY KEY, positive INTEGER, neutral INTEGER, negative INTEGER);
+CREATE TABLE IF NOT EXISTS helpfulness (
+    asin TEXT PRIMARY KEY, score_sum REAL, weight_sum REAL);
+"""
+
+
+class ReviewAnalytics:
+    """Materialized sentiment aggregates over reviews.csv-style data.
+
+    Each update only group-bys the new batch and adds the result onto the
+    stored aggregates, so the cost is proportional to the batch size and
+    queries never rescan the review history. Reviews already counted
+    (same reviewerID and asin) are skipped, so re-ingesting a file is safe.
+    The aggregates and the counted keys live in one SQLite database and
+    each update commits them in a single transaction, so a crash can never
+    leave a batch counted without its keys marked as seen.
+
+    Aggregates kept:
+        - product sentiment counts per asin
+        - daily sentiment counts (from unixReviewTime), for rolling windows
+        - helpfulness-weighted sentiment score per asin
+    """
+
+    def __init__(self, store_dir: str = "analytics"):
+        self.store_path = BASE_DIR / store_dir
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def update(self, df: pd.DataFrame, feeling_column: str = "reviewFeeling") -> int:
+        """Adds a batch of labeled reviews to the aggregates.
+
+        Args:
+            df: Reviews with reviewerID, asin, unixReviewTime, helpful_yes
+                and a sentiment label column.
+            feeling_column: Column holding positive/neutral/negative labels.
+                Case and surrounding whitespace are ignored.
+
+        Returns:
+            Number of reviews added.
+        """
+        labels = df[feeling_column].astype(str).str.strip().str.lower()
+        batch = df[labels.isin(FEELINGS)]
+        keys = batch[KEY_COLUMNS].astype(str)
+        is_first = ~keys.duplicated()
+        batch, keys, labels = batch[is_first], keys[is_first], labels[batch.index][is_first]
+
+        with self._connect() as conn:
+            is_new = ~pd.Series(self._seen(conn, keys), index=keys.index, dtype=bool)
+            batch, keys, labels = batch[is_new], keys[is_new], labels[is_new]
+            if batch.empty:
+                print("No new labeled reviews to add.")
+                return 0
+
+            one_hot = (
+                pd.get_dummies(labels)
+                .reindex(columns=FEELINGS, fill_value=False)
+                .astype("int64")
+            )
+            day = (batch["unixReviewTime"] // SECONDS_PER_DAY).astype("int64").rename("day")
+            weight = 1 + batch["helpful_yes"].fillna(0).clip(lower=0)
+            helpfulness = pd.DataFrame({
+                "score_sum": labels.map(FEELING_SCORES) * weight,
+                "weight_sum": weight,
+            }).groupby(batch["asin"]).sum()
+
+            # Keys and aggregates commit together when the block exits
+            conn.executemany("INSERT INTO seen_keys VALUES (?, ?)", keys.itertuples(index=False, name=None))
+            _add(conn, "product_sentiment", "asin", one_hot.groupby(batch["asin"]).sum())
+            _add(conn, "daily_sentiment", "day", one_hot.groupby(day).sum())
+            _add(conn, "helpfulness", "asin", helpfulness)
+
+        print(f"Added {len(batch)} labeled reviews to analytics.")
+        return len(batch)
+
+    def sentiment_counts(self, asin: str | None = None) -> pd.DataFrame:
+        """Returns sentiment counts per product, or for a single product."""
+        if asin is None:
+            return self._query("SELECT * FROM product_sentiment", "asin")
+        return self._query("SELECT * FROM product_sentiment WHERE asin = ?", "asin", (asin,))
+
+    def rolling_sentiment(self, window_days: int = 30) -> pd.DataFrame:
+        """Returns sentiment counts over a rolling window of review days.
+
+        Args:
+            window_days: Window length in days.
+
+        Returns:
+            DataFrame indexed by date with rolling counts and the positive share.
+        """
+        daily = self._query("SELECT * FROM daily_sentiment ORDER BY day", "day")
+        if daily.empty:
+            return daily
+        all_days = range(int(daily.index.min()), int(daily.index.max()) + 1)
+        rolling = daily.reindex(all_days, fill_value=0).rolling(window_days, min_periods=1).sum()
+        rolling.index = pd.to_datetime(rolling.index * SECONDS_PER_DAY, unit="s")
+        rolling.index.name = "date"
+        total = rolling[FEELINGS].sum(axis=1)
+        rolling["positive_share"] = (rolling["positive"] / total.where(total > 0)).fillna(0.0)
+        return rolling
+
+    def helpfulness_scores(self) -> pd.DataFrame:
+        """Returns the helpfulness-weighted sentiment score per product.
+
+        Each review votes +1 (positive), 0 (neutral) or -1 (negative),
+        weighted by 1 + its helpful_yes votes. Scores range from -1 to 1.
+        """
+        scores = self._query("SELECT * FROM helpfulness", "asin")
+        scores["weighted_score"] = scores["score_sum"] / scores["weight_sum"]
+        return scores.sort_values("weighted_score", ascending=False)
+
+    @contextmanager
+    def _connect(self):
+        """Opens the analytics database, committing (or rolling back) and closing it afterwards."""
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.store_path / ANALYTICS_DB)) as conn, conn:
+            yield conn
+
+    def _query(self, sql: str, index_col: str, params: tuple = ()) -> pd.DataFrame:
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, index_col=index_col, params=params)
+
+    @staticmethod
+    def _seen(conn: sqlite3.Connection, keys: pd.DataFrame) -> list[bool]:
+        """Returns, for each (reviewerID, asin) row, whether it was already counted."""
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS batch_keys (pos INTEGER, reviewerID TEXT, asin TEXT)")
+        conn.execute("DELETE FROM batch_keys")
+        conn.executemany("INSERT INTO batch_keys VALUES (?, ?, ?)",
+                         ((pos, *key) for pos, key in enumerate(keys.itertuples(index=False, name=None))))
+        seen = [False] * len(keys)
+        for (pos,) in conn.execute("SELECT pos FROM batch_keys JOIN seen_keys USING (reviewerID, asin)"):
+            seen[pos] = True
+        return seen
+
+
+def _add(conn: sqlite3.Connection, table: str, key: str, batch: pd.DataFrame) -> None:
+    """Adds batch aggregates onto a stored aggregate table, matching rows by key."""
+    columns = list(batch.columns)
+    sql = (f"INSERT INTO {table} ({key}, {', '.join(columns)}) VALUES ({', '.join('?' * (len(columns) + 1))}) "
+           f"ON CONFLICT({key}) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in columns)}")
+    conn.executemany(sql, batch.reset_index().itertuples(index=False, name=None))
@@ -3,11 +3,18 @@ Review analysis utilities.
 Uses AI to analyze product reviews for sentiment and categories.
 """
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 import pandas as pd
 from google import genai
 from groq import Groq
 import prompts
 from ai_utils import ask_gemini, ask_groq
+from context_cache import PrefixCache, split_template
+from model_scheduler import ModelScheduler
+from profiling import profile_stage
+from text_clustering import hashed_tfidf, mini_batch_kmeans, cluster_representatives
 
 
 def ai_analyze_reviews(df: pd.DataFrame, client, analysis_type: str) -> pd.DataFrame:
@@ -32,13 +39,14 @@ def ai_analyze_reviews(df: pd.DataFrame, client, analysis_type: str) -> pd.DataF
         return df
 
     try:
-        # Build numbered review list
-        reviews_numbered = ""
-        for i, review in enumerate(df["reviewText"], 1):
-            reviews_numbered += f"{i}. {review}\n"
-        
-        # Format prompt with count and reviews
-        prompt = config["prompt"].format(count=len(df), reviews=reviews_numbered)
+        with profile_stage("review_analyzer.build_prompt"):
+            # Build numbered review list
+            reviews_numbered = ""
+            for i, review in enumerate(df["reviewText"], 1):
+                reviews_numbered += f"{i}. {review}\n"
+            
+            # Format prompt with count and reviews
+            prompt = config["prompt"].format(count=len(df), reviews=reviews_numbered)
         
         # Call appropriate AI client
         result = None
@@ -51,8 +59,9 @@ def ai_analyze_reviews(df: pd.DataFrame, client, analysis_type: str) -> pd.DataF
             return df
         
         if result:
-            pattern = re.compile(config["regex"], re.IGNORECASE)
-            matches = pattern.findall(result)
+            with profile_stage("review_analyzer.parse_response"):
+                pattern = re.compile(config["regex"], re.IGNORECASE)
+                matches = pattern.findall(result)
             
             if len(matches) == len(df):
                 df[config["column"]] = matches
@@ -68,6 +77,87 @@ def ai_analyze_reviews(df: pd.DataFrame, client, analysis_type: str) -> pd.DataF
         return df
 
 
+def ai_analyze_reviews_chunked(df: pd.DataFrame, client, analysis_type: str,
+                               chunk_size: int = 100, max_workers: int = 4,
+                               model_name: str = "gemma-3-27b-it",
+                               scheduler: ModelScheduler | None = None) -> pd.DataFrame:
+    """Runs a review analysis in chunks, sharing the instruction prefix.
+
+    Each chunk uses the same prompt as ai_analyze_reviews. With a Gemini
+    client, the instruction part before the reviews is formatted once per
+    job, and uploaded as cached content when the model supports it and
+    the prefix is large enough, so each chunk only sends its reviews.
+
+    Args:
+        df: DataFrame with a 'reviewText' column.
+        client: Gemini or Groq client.
+        analysis_type: Key from prompts.AI_PROMPTS (e.g., 'feelings', 'categories').
+        chunk_size: Reviews per request.
+        max_workers: Number of concurrent requests.
+        model_name: Gemini model to use (default: gemma-3-27b-it).
+        scheduler: Optional running ModelScheduler. When given, chunks are
+            sent through it and spread across models by quota; model_name
+            is ignored and the prefix is sent inline, since cached content
+            is tied to a single model.
+
+    Returns:
+        DataFrame with the new analysis column added. Rows of chunks whose
+        result count did not match are left empty.
+    """
+    if analysis_type not in prompts.AI_PROMPTS:
+        print(f"Error: Unknown analysis type '{analysis_type}'. Available: {list(prompts.AI_PROMPTS.keys())}")
+        return df
+    if df.empty:
+        print(f"Error: No data provided for '{analysis_type}' analysis.")
+        return df
+    if not isinstance(client, (genai.Client, Groq)):
+        print("Error: Unknown client type.")
+        return df
+
+    config = prompts.AI_PROMPTS[analysis_type]
+    prefix_template, suffix_template = split_template(config["prompt"], "reviews")
+    pattern = re.compile(config["regex"], re.IGNORECASE)
+    reviews = df["reviewText"].tolist()
+    chunks = [reviews[start:start + chunk_size] for start in range(0, len(reviews), chunk_size)]
+    # Chunks of the same length share an identical prefix
+    uses_per_length = Counter(len(chunk) for chunk in chunks)
+
+    def analyze_chunk(prefix_cache: PrefixCache | None, chunk: list[str]) -> list[str] | None:
+        if prefix_cache is not None:
+            prefix = prefix_cache.format_prefix(prefix_template, count=len(chunk))
+        else:
+            prefix = prefix_template.format(count=len(chunk))
+        data = "".join(f"{i}. {review}\n" for i, review in enumerate(chunk, 1)) + suffix_template.format()
+
+        if scheduler is not None:
+            result = scheduler.ask(prefix + data)
+        elif prefix_cache is not None:
+            result = prefix_cache.ask(prefix, data, expected_uses=uses_per_length[len(chunk)])
+        else:
+            result = ask_groq(client, prefix + data)
+        if not result:
+            return None
+
+        matches = pattern.findall(result)
+        if len(matches) != len(chunk):
+            print(f"Warning: Received {len(matches)} results for {len(chunk)} reviews. Mismatch occurred.")
+            return None
+        return matches
+
+    with ExitStack() as stack:
+        prefix_cache = None
+        if isinstance(client, genai.Client) and scheduler is None:
+            prefix_cache = stack.enter_context(PrefixCache(client, model_name))
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+        results = list(executor.map(lambda chunk: analyze_chunk(prefix_cache, chunk), chunks))
+
+    column = []
+    for chunk, matches in zip(chunks, results):
+        column.extend(matches if matches is not None else [None] * len(chunk))
+    df[config["column"]] = column
+    return df
+
+
 def ai_evalution_of_feelings(df: pd.DataFrame, client) -> pd.DataFrame:
     """Evaluates the feelings of users based on the product reviews.
     
@@ -96,3 +186,52 @@ def ai_identify_negative_categories(df: pd.DataFrame, client) -> pd.DataFrame:
         DataFrame with 'category' column added.
     """
     return ai_analyze_reviews(df, client, "categories")
+
+
+def ai_identify_negative_categories_clustered(df: pd.DataFrame, client, n_clusters: int = 8,
+                                              representatives: int = 3,
+                                              extra_stopwords: list[str] | None = None) -> pd.DataFrame:
+    """Identifies categories for negative reviews by clustering them first.
+
+    Reviews are grouped offline with hashed TF-IDF and mini-batch k-means.
+    Only a few representatives per cluster are sent to the AI, in a single
+    prompt, and each cluster's category is applied to all its members. The
+    prompt grows with the number of clusters instead of the number of
+    reviews, and similar reviews always get the same category.
+
+    Args:
+        df: DataFrame with 'reviewText' column.
+        client: AI client (Gemini or Groq).
+        n_clusters: Maximum number of categories to create.
+        representatives: Reviews per cluster shown to the AI.
+        extra_stopwords: Words common to the whole dataset (e.g. the product
+            type) that should not drive the clustering.
+
+    Returns:
+        DataFrame with 'cluster' and 'category' columns added.
+    """
+    if df.empty:
+        print("Error: No data provided for 'cluster_labels' analysis.")
+        return df
+
+    texts = df["reviewText"].fillna("").astype(str).tolist()
+    features = hashed_tfidf(texts, extra_stopwords=extra_stopwords or ())
+    labels, centers = mini_batch_kmeans(features, n_clusters)
+    cluster_ids = sorted(set(labels.tolist()))
+    examples = cluster_representatives(features, labels, centers, representatives)
+    print(f"Grouped {len(texts)} reviews into {len(cluster_ids)} clusters.")
+
+    df_clusters = pd.DataFrame({
+        "reviewText": [
+            " | ".join(texts[pos][:300].replace("\n", " ") for pos in examples[cluster])
+            for cluster in cluster_ids
+        ]
+    })
+    df_clusters = ai_analyze_reviews(df_clusters, client, "cluster_labels")
+
+    df["cluster"] = labels
+    column = prompts.AI_PROMPTS["cluster_labels"]["column"]
+    if column in df_clusters:
+        cluster_to_category = dict(zip(cluster_ids, df_clusters[column].str.strip()))
+        df[column] = df["cluster"].map(cluster_to_category)
+    return df
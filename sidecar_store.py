@@ -0,0 +1,86 @@
+"""
+Sidecar result columns stored apart from the base dataset.
+Analysis outputs (feeling, category, translation) are saved as compact
+key + value files and joined onto the base data only when read.
+"""
+from pathlib import Path
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+
+SIDECAR_DIR = "sidecars"
+REVIEW_KEYS = ["reviewerID", "asin"]
+
+
+def save_sidecar(df: pd.DataFrame, column: str, keys: list[str] = REVIEW_KEYS,
+                 dataset: str = "reviews") -> None:
+    """Appends one result column to its sidecar file.
+
+    Only the key columns and the result column are written, and rows are
+    appended, so labeling more reviews never rewrites existing data.
+    When a key is labeled twice, the latest value wins on read.
+
+    Args:
+        df: DataFrame holding the key columns and the result column.
+        column: Name of the result column to store.
+        keys: Columns that identify a row of the base dataset.
+        dataset: Name of the base dataset the sidecar belongs to.
+    """
+    missing = [c for c in [*keys, column] if c not in df.columns]
+    if missing:
+        print(f"Error: Missing columns for sidecar '{column}': {missing}")
+        return
+
+    rows = df.loc[df[column].notna(), [*keys, column]]
+    if rows.empty:
+        print(f"No values to save for sidecar '{column}'.")
+        return
+
+    path = _sidecar_path(dataset, column)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows.to_csv(path, mode="a", header=not path.exists(), index=False, encoding="utf-8", compression="gzip")
+    print(f"Saved {len(rows)} '{column}' values to {path.relative_to(BASE_DIR)}")
+
+
+def read_sidecar(column: str, keys: list[str] = REVIEW_KEYS, dataset: str = "reviews") -> pd.DataFrame:
+    """Reads a sidecar, keeping the latest value for each key.
+
+    Returns:
+        DataFrame with the key columns and the result column (empty if none saved).
+    """
+    path = _sidecar_path(dataset, column)
+    if not path.exists():
+        return pd.DataFrame(columns=[*keys, column])
+    sidecar = pd.read_csv(path, dtype={key: str for key in keys}, compression="gzip")
+    return sidecar.drop_duplicates(subset=keys, keep="last")
+
+
+def list_sidecars(dataset: str = "reviews") -> list[str]:
+    """Returns the names of the result columns saved for a dataset."""
+    folder = BASE_DIR / SIDECAR_DIR / dataset
+    return sorted(p.name.removesuffix(".csv.gz") for p in folder.glob("*.csv.gz"))
+
+
+def load_with_sidecars(base_file: str, sidecars: list[str], columns: list[str] | None = None,
+                       keys: list[str] = REVIEW_KEYS, dataset: str = "reviews") -> pd.DataFrame:
+    """Reads the base dataset and joins the requested sidecar columns by key.
+
+    Args:
+        base_file: Path to the base CSV (e.g. reviews.csv).
+        sidecars: Result columns to join.
+        columns: Base columns to read (keys are always included). None reads all.
+        keys: Columns that identify a row of the base dataset.
+        dataset: Name of the base dataset the sidecars belong to.
+
+    Returns:
+        Base rows with one extra column per sidecar (NaN where not labeled).
+    """
+    usecols = None if columns is None else list(dict.fromkeys([*keys, *columns]))
+    df = pd.read_csv(base_file, usecols=usecols, dtype={key: str for key in keys})
+    for column in sidecars:
+        df = df.merge(read_sidecar(column, keys, dataset), on=keys, how="left")
+    return df
+
+
+def _sidecar_path(dataset: str, column: str) -> Path:
+    return BASE_DIR / SIDECAR_DIR / dataset / f"{column}.csv.gz"
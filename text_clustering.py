@@ -0,0 +1,199 @@
+"""
+Offline text clustering utilities.
+Sparse hashed TF-IDF features and mini-batch k-means implemented with NumPy.
+"""
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+import numpy as np
+import pandas as pd
+
+TOKEN_REGEX = re.compile(r"[^\W\d_]{2,}")
+
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "was", "are", "but", "not", "you",
+    "have", "has", "had", "its", "it's", "they", "them", "then", "than", "there",
+    "from", "all", "any", "can", "one", "out", "get", "got", "very", "just", "will",
+    "would", "after", "before", "when", "what", "which", "about", "into", "been",
+    "were", "also", "only", "some", "our", "your", "his", "her", "she", "him",
+    "who", "did", "does", "don", "didn", "use", "used",
+}
+
+
+@dataclass
+class SparseRows:
+    """Row-compressed sparse matrix (CSR layout) of float32 feature vectors.
+
+    Row r's non-zero values are data[indptr[r]:indptr[r + 1]], in the
+    columns given by the same slice of indices.
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    n_features: int
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def dense_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the given rows as a dense array of shape (len(rows), n_features)."""
+        rows = np.asarray(rows, dtype=np.intp)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        out = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        out[np.repeat(np.arange(len(rows)), lengths), self.indices[positions]] = self.data[positions]
+        return out
+
+    def dot(self, vectors: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        """Multiplies by dense vectors (k, n_features). Returns shape (n_rows, k)."""
+        vectors_t = np.ascontiguousarray(vectors.T, dtype=np.float32)
+        out = np.empty((len(self), len(vectors)), dtype=np.float32)
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            lo, hi = self.indptr[start], self.indptr[end]
+            # Only one chunk's (non-zeros x k) products are held at a time
+            products = self.data[lo:hi, None] * vectors_t[self.indices[lo:hi]]
+            row_ids = np.repeat(np.arange(end - start), np.diff(self.indptr[start:end + 1]))
+            for k in range(len(vectors)):
+                out[start:end, k] = np.bincount(row_ids, weights=products[:, k], minlength=end - start)
+        return out
+
+    def row_dot(self, vectors: np.ndarray) -> np.ndarray:
+        """Dot product of each row with its own dense vector (n_rows, n_features)."""
+        row_ids = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        weights = self.data * vectors[row_ids, self.indices]
+        return np.bincount(row_ids, weights=weights, minlength=len(self)).astype(np.float32)
+
+
+def hashed_tfidf(texts: Sequence[str], n_features: int = 2048, chunk_size: int = 10000,
+                 extra_stopwords: Iterable[str] = ()) -> SparseRows:
+    """Builds L2-normalized TF-IDF vectors using the hashing trick.
+
+    Vectors are stored sparsely, so memory grows with the number of
+    distinct tokens per document rather than with n_features. Tokens are
+    hashed once per distinct token in each chunk of documents.
+
+    Args:
+        texts: Documents to vectorize.
+        n_features: Number of hashed feature buckets.
+        chunk_size: Documents tokenized and hashed together.
+        extra_stopwords: Dataset-specific words to ignore on top of the
+            generic STOPWORDS (e.g. the product type every review mentions).
+
+    Returns:
+        SparseRows with one row per text.
+    """
+    stopwords = STOPWORDS | {word.lower() for word in extra_stopwords}
+    indptr = [np.zeros(1, dtype=np.int64)]
+    indices, counts = [], []
+    offset = 0
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        tokens = [TOKEN_REGEX.findall(str(text).lower()) for text in chunk]
+        lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        token_ids, vocabulary = pd.factorize(pd.Series([tok for t in tokens for tok in t], dtype=object))
+        buckets = np.array([-1 if tok in stopwords else zlib.crc32(tok.encode("utf-8")) % n_features
+                            for tok in vocabulary], dtype=np.int64)
+        cols = buckets[token_ids]
+        rows = np.repeat(np.arange(len(chunk), dtype=np.int64), lengths)
+        kept = cols >= 0
+
+        # Unique (row, column) keys come back sorted by row, then column
+        keys, key_counts = np.unique(rows[kept] * n_features + cols[kept], return_counts=True)
+        row_lengths = np.bincount(keys // n_features, minlength=len(chunk))
+        indptr.append(offset + np.cumsum(row_lengths))
+        offset += len(keys)
+        indices.append((keys % n_features).astype(np.int32))
+        counts.append(key_counts.astype(np.float32))
+
+    indptr = np.concatenate(indptr)
+    indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int32)
+    data = np.concatenate(counts) if counts else np.empty(0, dtype=np.float32)
+
+    # Sublinear term frequency and smoothed inverse document frequency
+    doc_freq = np.bincount(indices, minlength=n_features)
+    idf = np.log((1 + len(texts)) / (1 + doc_freq)).astype(np.float32) + 1.0
+    data = np.log1p(data) * idf[indices]
+
+    row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(texts))).astype(np.float32)
+    norms[norms == 0] = 1.0
+    data /= norms[row_ids]
+    return SparseRows(indptr, indices, data.astype(np.float32), n_features)
+
+
+def mini_batch_kmeans(features: SparseRows, n_clusters: int, batch_size: int = 256,
+                      n_iter: int = 100, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """Clusters L2-normalized vectors with mini-batch (spherical) k-means.
+
+    Only the sampled mini-batch is densified at each step.
+
+    Args:
+        features: Sparse vectors from hashed_tfidf, rows L2-normalized.
+        n_clusters: Number of clusters.
+        batch_size: Samples per mini-batch update.
+        n_iter: Number of mini-batch updates.
+        seed: Random seed, so the same data gives the same clusters.
+
+    Returns:
+        Tuple of (labels, centers).
+    """
+    n_samples = len(features)
+    n_clusters = max(1, min(n_clusters, n_samples))
+    rng = np.random.default_rng(seed)
+    centers = _kmeans_plus_plus(features, n_clusters, rng)
+    seen = np.zeros(n_clusters, dtype=np.float32)
+
+    for _ in range(n_iter):
+        batch = features.dense_rows(rng.choice(n_samples, size=min(batch_size, n_samples), replace=False))
+        nearest = np.argmax(batch @ centers.T, axis=1)
+
+        # Per-center learning rate 1/count, applied to the whole batch at once
+        batch_counts = np.bincount(nearest, minlength=n_clusters).astype(np.float32)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, nearest, batch)
+        seen += batch_counts
+        updated = batch_counts > 0
+        rate = (batch_counts[updated] / seen[updated])[:, None]
+        centers[updated] = (1 - rate) * centers[updated] + rate * (sums[updated] / batch_counts[updated, None])
+        centers /= np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12)
+
+    labels = assign_clusters(features, centers)
+    return labels, centers
+
+
+def assign_clusters(features: SparseRows, centers: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+    """Assigns each vector to its most similar center, in chunks."""
+    return np.argmax(features.dot(centers, chunk_size), axis=1)
+
+
+def cluster_representatives(features: SparseRows, labels: np.ndarray, centers: np.ndarray,
+                            per_cluster: int = 3) -> dict[int, list[int]]:
+    """Picks the members closest to each cluster center.
+
+    Returns:
+        Dict mapping cluster id to row positions of its representatives.
+    """
+    similarity = features.row_dot(centers[labels])
+    representatives = {}
+    for cluster in np.unique(labels):
+        members = np.flatnonzero(labels == cluster)
+        best = members[np.argsort(-similarity[members])[:per_cluster]]
+        representatives[int(cluster)] = best.tolist()
+    return representatives
+
+
+def _kmeans_plus_plus(features: SparseRows, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Seeds centers with k-means++ on cosine distance."""
+    centers = features.dense_rows([rng.integers(len(features))])
+    distances = 1.0 - features.dot(centers)[:, 0]
+    for _ in range(1, n_clusters):
+        weights = np.clip(distances, 0, None).astype(np.float64)
+        total = weights.sum()
+        index = rng.choice(len(features), p=weights / total) if total > 0 else rng.integers(len(features))
+        center = features.dense_rows([index])
+        centers = np.vstack([centers, center])
+        distances = np.minimum(distances, 1.0 - features.dot(center)[:, 0])
+    return centers